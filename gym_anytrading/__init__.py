@@ -1,68 +1,105 @@
-from gymnasium.envs.registration import register
-from copy import deepcopy
+from functools import partial
+
+from gymnasium.envs.registration import register, load_env_creator
 
 from . import datasets
 from .typedefs import *
 
 
+def _make_dataset_env(entry_point, dataset, columns=None, **kwargs):
+    """Resolve a bundled dataset only when the env is actually constructed.
+
+    The cached dataset is shared between envs instead of being deep-copied, so
+    `gym.make` neither loads nor duplicates data for envs that are never made.
+    `df`, `frame_bound` and the `columns` series can still be overridden.
+    """
+    if "df" not in kwargs:
+        kwargs["df"] = getattr(datasets, dataset)
+    df = kwargs["df"]
+    for key, column in (columns or {}).items():
+        if key not in kwargs:
+            kwargs[key] = df[column]
+    if "frame_bound" not in kwargs:
+        kwargs["frame_bound"] = (kwargs["window_size"], len(df))
+    return load_env_creator(entry_point)(**kwargs)
+
+
+_CRYPTO_COLUMNS = {"ask": "High", "bid": "Low", "prices": "Close"}
+
+
 register(
     id="forex-v0",
-    entry_point="gym_anytrading.envs:ForexEnv",
+    entry_point=partial(
+        _make_dataset_env, "gym_anytrading.envs:ForexEnv", "FOREX_EURUSD_1H_ASK"
+    ),
     kwargs={
-        "df": deepcopy(datasets.FOREX_EURUSD_1H_ASK),
         "window_size": 24,
-        "frame_bound": (24, len(datasets.FOREX_EURUSD_1H_ASK)),
     },
 )
 
 register(
     id="stocks-v0",
-    entry_point="gym_anytrading.envs:StocksEnv",
+    entry_point=partial(
+        _make_dataset_env,
+        "gym_anytrading.envs:StocksEnv",
+        "STOCKS_GOOGL",
+        {"prices": "Close", "ask": "Close", "bid": "Close"},
+    ),
     kwargs={
-        "df": deepcopy(datasets.STOCKS_GOOGL),
         "window_size": 30,
-        "frame_bound": (30, len(datasets.STOCKS_GOOGL)),
     },
 )
 
 register(
     id="crypto-v0",
-    entry_point="gym_anytrading.envs:CryptoEnv",
+    entry_point=partial(
+        _make_dataset_env,
+        "gym_anytrading.envs:CryptoEnv",
+        "CRYPTO_ETHUSDT_5M",
+        _CRYPTO_COLUMNS,
+    ),
+    vector_entry_point=partial(
+        _make_dataset_env,
+        "gym_anytrading.envs:CryptoVectorEnv",
+        "CRYPTO_ETHUSDT_5M",
+        _CRYPTO_COLUMNS,
+    ),
     kwargs={
-        "df": deepcopy(datasets.CRYPTO_ETHUSDT_5M),
-        "ask": deepcopy(datasets.CRYPTO_ETHUSDT_5M).High,
-        "bid": deepcopy(datasets.CRYPTO_ETHUSDT_5M).Low,
-        "prices": deepcopy(datasets.CRYPTO_ETHUSDT_5M).Close,
         "window_size": 24,
-        "frame_bound": (24, len(datasets.CRYPTO_ETHUSDT_5M)),
         "trade_fee": 0.0003,
     },
 )
 
 register(
     id="crypto-v1",
-    entry_point="gym_anytrading.envs2d:CryptoEnv",
+    entry_point=partial(
+        _make_dataset_env,
+        "gym_anytrading.envs2d:CryptoEnv",
+        "CRYPTO_ETHUSDT_5M",
+        _CRYPTO_COLUMNS,
+    ),
     kwargs={
-        "df": deepcopy(datasets.CRYPTO_ETHUSDT_5M),
-        "ask": deepcopy(datasets.CRYPTO_ETHUSDT_5M).High,
-        "bid": deepcopy(datasets.CRYPTO_ETHUSDT_5M).Low,
-        "prices": deepcopy(datasets.CRYPTO_ETHUSDT_5M).Close,
         "window_size": 32,
-        "frame_bound": (32, len(datasets.CRYPTO_ETHUSDT_5M)),
         "trade_fee": 0.0003,
     },
 )
 
 register(
     id="crypto-v2",
-    entry_point="gym_anytrading.envsC:CryptoEnv",
+    entry_point=partial(
+        _make_dataset_env,
+        "gym_anytrading.envsC:CryptoEnv",
+        "CRYPTO_ETHUSDT_5M",
+        _CRYPTO_COLUMNS,
+    ),
+    vector_entry_point=partial(
+        _make_dataset_env,
+        "gym_anytrading.envsC:CryptoVectorEnv",
+        "CRYPTO_ETHUSDT_5M",
+        _CRYPTO_COLUMNS,
+    ),
     kwargs={
-        "df": deepcopy(datasets.CRYPTO_ETHUSDT_5M),
-        "ask": deepcopy(datasets.CRYPTO_ETHUSDT_5M).High,
-        "bid": deepcopy(datasets.CRYPTO_ETHUSDT_5M).Low,
-        "prices": deepcopy(datasets.CRYPTO_ETHUSDT_5M).Close,
         "window_size": 24,
-        "frame_bound": (24, len(datasets.CRYPTO_ETHUSDT_5M)),
         "trade_fee": 0.0003,
     },
 )
@@ -1,10 +1,32 @@
+from functools import lru_cache
+
 from .utils import load_dataset as _load_dataset
+from .utils import load_csv
+
+# Bundled datasets and their index columns. They are parsed lazily on first
+# attribute access (e.g. `datasets.CRYPTO_ETHUSDT_5M`) and cached afterwards,
+# so every consumer shares a single DataFrame which must be treated as
+# read-only: `.copy()` it before modifying.
+_DATASETS = {
+    # CRYPTO datasets
+    "CRYPTO_ETHUSDT_5M": "Epoch",
+    # FOREX datasets
+    "FOREX_EURUSD_1H_ASK": "Time",
+    # Stocks datasets
+    "STOCKS_GOOGL": "Date",
+}
+
+
+@lru_cache(maxsize=None)
+def _get_dataset(name):
+    return _load_dataset(name, _DATASETS[name])
+
 
-# Load CRYPTO datasets
-CRYPTO_ETHUSDT_5M = _load_dataset("CRYPTO_ETHUSDT_5M", "Epoch")
+def __getattr__(name):
+    if name in _DATASETS:
+        return _get_dataset(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Load FOREX datasets
-FOREX_EURUSD_1H_ASK = _load_dataset("FOREX_EURUSD_1H_ASK", "Time")
 
-# Load Stocks datasets
-STOCKS_GOOGL = _load_dataset("STOCKS_GOOGL", "Date")
+def __dir__():
+    return sorted([*globals(), *_DATASETS])
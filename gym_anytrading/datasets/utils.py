@@ -1,9 +1,192 @@
 import os
+import json
+import glob
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
 import pandas as pd
 
+_CACHE_VERSION = 1
+
 
-def load_dataset(name, index_name):
+def load_dataset(name, index_name, cache=True):
+    """Load a bundled dataset, going through the on-disk column cache.
+
+    The first load parses the CSV and writes one `.npy` file per column to the
+    cache dir (`$GYM_ANYTRADING_CACHE_DIR`, default `~/.cache/gym_anytrading`).
+    Later loads memory-map those files read-only instead of parsing the CSV
+    again. The cache is keyed by the CSV's path, size and mtime, so editing the
+    CSV invalidates it. Pass `cache=False` to always read the CSV.
+    """
     base_dir = os.path.dirname(os.path.abspath(__file__))
     path = os.path.join(base_dir, "data", name + ".csv")
-    df = pd.read_csv(path, parse_dates=True, index_col=index_name)
-    return df
+    if not cache:
+        return _read_csv(path, index_name)
+
+    cache_path = os.path.join(_cache_dir(), f"{name}-{_cache_key(path, index_name)}")
+    if os.path.isdir(cache_path):
+        try:
+            return _read_cache(cache_path)
+        except (OSError, ValueError, KeyError):
+            pass  # corrupted cache entry, rebuild it below
+
+    df = _read_csv(path, index_name)
+    try:
+        if not _write_cache(df, name, cache_path, path):
+            return df
+    except OSError:
+        return df  # read-only or full cache dir: keep working without a cache
+    return _read_cache(cache_path)
+
+
+def load_csv(
+    path,
+    timestamp_column,
+    columns,
+    timestamp_format="ISO8601",
+    dtype=np.float32,
+    prices="Close",
+    ask="High",
+    bid="Low",
+    chunksize=1_000_000,
+):
+    """Load a user CSV with an explicit schema and bounded peak memory.
+
+    Only `timestamp_column` and `columns` (plus the `prices`/`ask`/`bid`
+    columns) are read, with the C engine, `chunksize` rows at a time. The
+    timestamps are parsed with `timestamp_format` (no datetime inference) and
+    every other column is stored as `dtype`.
+
+    Returns:
+        The `(prices, ask, bid, df)` tuple expected by the env constructors,
+        where `prices`, `ask` and `bid` are columns of `df`.
+    """
+    columns = list(dict.fromkeys([*columns, prices, ask, bid]))
+
+    index_chunks = []
+    value_chunks = {column: [] for column in columns}
+    reader = pd.read_csv(
+        path,
+        engine="c",
+        usecols=[timestamp_column, *columns],
+        dtype={timestamp_column: str} | {column: dtype for column in columns},
+        chunksize=chunksize,
+    )
+    for chunk in reader:
+        index_chunks.append(
+            pd.DatetimeIndex(
+                pd.to_datetime(chunk[timestamp_column], format=timestamp_format)
+            )
+        )
+        for column in columns:
+            value_chunks[column].append(chunk[column].to_numpy())
+        del chunk  # release the chunk before parsing the next one
+
+    if not index_chunks:
+        raise ValueError(f"{path} has no rows")
+
+    index = index_chunks[0].append(index_chunks[1:]).rename(timestamp_column)
+    df = pd.DataFrame(
+        {column: np.concatenate(value_chunks.pop(column)) for column in columns},
+        index=index,
+        copy=False,
+    )
+    return df[prices], df[ask], df[bid], df
+
+
+def _read_csv(path, index_name):
+    return pd.read_csv(path, parse_dates=True, index_col=index_name)
+
+
+def _cache_dir():
+    cache_dir = os.environ.get("GYM_ANYTRADING_CACHE_DIR")
+    if cache_dir:
+        return cache_dir
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "gym_anytrading")
+
+
+def _cache_key(path, index_name):
+    stat = os.stat(path)
+    key = f"{_CACHE_VERSION}:{path}:{stat.st_size}:{stat.st_mtime_ns}:{index_name}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def _write_cache(df, name, cache_path, source):
+    if not all(dtype.kind in "biuf" for dtype in df.dtypes):
+        return False  # only numeric columns are cached
+
+    cache_root = os.path.dirname(cache_path)
+    os.makedirs(cache_root, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=cache_root, prefix=".tmp-")
+    try:
+        meta = {
+            "source": source,
+            "index_name": df.index.name,
+            "columns": [*df.columns],
+            "tz": None,
+        }
+        if isinstance(df.index, pd.DatetimeIndex):
+            meta["index"] = "datetime"
+            meta["tz"] = None if df.index.tz is None else str(df.index.tz)
+            index = df.index.as_unit("ns").asi8
+        else:
+            meta["index"] = "str"
+            index = np.asarray(df.index, dtype=str)
+        np.save(os.path.join(tmp_path, "index.npy"), index)
+        for i, column in enumerate(df.columns):
+            values = np.ascontiguousarray(df[column].to_numpy())
+            np.save(os.path.join(tmp_path, f"column_{i}.npy"), values)
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        # drop outdated entries of the same CSV before publishing the new one,
+        # leaving those of other installs sharing the cache dir alone
+        for stale in glob.glob(os.path.join(cache_root, f"{name}-*")):
+            if stale != cache_path and _cache_source(stale) == source:
+                shutil.rmtree(stale, ignore_errors=True)
+        os.rename(tmp_path, cache_path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not os.path.isdir(cache_path):  # lost a race against another worker
+            raise
+    return True
+
+
+def _cache_source(cache_path):
+    # CSV path an entry was built from, None if unknown
+    try:
+        with open(os.path.join(cache_path, "meta.json")) as f:
+            return json.load(f).get("source")
+    except (OSError, ValueError):
+        return None
+
+
+def _read_cache(cache_path):
+    with open(os.path.join(cache_path, "meta.json")) as f:
+        meta = json.load(f)
+
+    index = np.load(os.path.join(cache_path, "index.npy"), allow_pickle=False)
+    if meta["index"] == "datetime":
+        index = pd.DatetimeIndex(index.view("M8[ns]"), name=meta["index_name"])
+        if meta["tz"] is not None:
+            index = index.tz_localize("UTC").tz_convert(meta["tz"])
+    else:
+        index = pd.Index(index.astype(object), name=meta["index_name"])
+
+    # plain ndarray views over the read-only memmaps
+    columns = {
+        column: np.asarray(
+            np.load(
+                os.path.join(cache_path, f"column_{i}.npy"),
+                mmap_mode="r",
+                allow_pickle=False,
+            )
+        )
+        for i, column in enumerate(meta["columns"])
+    }
+    return pd.DataFrame(columns, index=index, copy=False)
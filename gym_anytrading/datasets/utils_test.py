@@ -0,0 +1,62 @@
+"""datasets.utils Test"""
+
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from gym_anytrading.datasets.utils import load_dataset, load_csv
+
+
+def test_load_dataset_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("GYM_ANYTRADING_CACHE_DIR", str(tmp_path))
+
+    for name, index_name in [
+        ("CRYPTO_ETHUSDT_5M", "Epoch"),
+        ("FOREX_EURUSD_1H_ASK", "Time"),
+        ("STOCKS_GOOGL", "Date"),
+    ]:
+        expected = load_dataset(name, index_name, cache=False)
+
+        # 1st load writes the cache, 2nd load reads it back
+        for _ in range(2):
+            df = load_dataset(name, index_name)
+            pd.testing.assert_frame_equal(df, expected)
+            assert not df["Close"].to_numpy().flags.writeable
+
+        # one entry per dataset
+        assert len([p for p in os.listdir(tmp_path) if p.startswith(name)]) == 1
+
+
+def test_load_dataset_cache_shared(tmp_path, monkeypatch):
+    monkeypatch.setenv("GYM_ANYTRADING_CACHE_DIR", str(tmp_path))
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(base_dir, "data", "STOCKS_GOOGL.csv")
+
+    # an outdated entry of this CSV and an entry of another install's copy
+    for key, source in [("outdated", path), ("other", "/elsewhere/STOCKS_GOOGL.csv")]:
+        os.makedirs(tmp_path / f"STOCKS_GOOGL-{key}")
+        with open(tmp_path / f"STOCKS_GOOGL-{key}" / "meta.json", "w") as f:
+            json.dump({"source": source}, f)
+
+    load_dataset("STOCKS_GOOGL", "Date")
+    entries = sorted(p for p in os.listdir(tmp_path) if p.startswith("STOCKS_GOOGL"))
+    assert len(entries) == 2
+    assert "STOCKS_GOOGL-other" in entries
+    assert "STOCKS_GOOGL-outdated" not in entries
+
+
+def test_load_csv():
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(base_dir, "data", "CRYPTO_ETHUSDT_5M.csv")
+    expected = load_dataset("CRYPTO_ETHUSDT_5M", "Epoch", cache=False)
+
+    prices, ask, bid, df = load_csv(path, "Epoch", ["Volume"], chunksize=10_000)
+
+    assert [*df.columns] == ["Volume", "Close", "High", "Low"]
+    assert (df.dtypes == np.float32).all()
+    pd.testing.assert_index_equal(df.index, expected.index)
+    np.testing.assert_array_equal(prices, expected["Close"].astype(np.float32))
+    np.testing.assert_array_equal(ask, expected["High"].astype(np.float32))
+    np.testing.assert_array_equal(bid, expected["Low"].astype(np.float32))
@@ -3,3 +3,4 @@ from ..typedefs import Actions, Positions
 from .forex_env import ForexEnv
 from .stocks_env import StocksEnv
 from .crypto_env import CryptoEnv
+from .vector_env import CryptoVectorEnv
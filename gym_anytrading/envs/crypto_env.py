@@ -4,6 +4,8 @@ import numpy as np
 import pandas as pd
 
 from .stocks_env import StocksEnv
+from ..oracle import oracle_actions
+from ..replay import replay
 from ..typedefs import Actions, Positions, RewardType, OrderAction, Position
 
 INF = 1e10
@@ -24,6 +26,10 @@ class CryptoEnv(StocksEnv):
         render_mode=None,
         reward_type=RewardType.LogReturns,
         box_range: Tuple[float, float] = (-INF, INF),
+        info_keys=None,
+        history_retention="full",
+        mark_to_market=False,
+        observation_mode="window",
     ):
         assert len(frame_bound) == 2
 
@@ -41,13 +47,18 @@ class CryptoEnv(StocksEnv):
             trade_fee_ask_percent=trade_fee,
             trade_fee_bid_percent=trade_fee,
             box_range=box_range,
+            info_keys=info_keys,
+            history_retention=history_retention,
+            mark_to_market=mark_to_market,
+            observation_mode=observation_mode,
         )
 
     def _process_data(self):
-        prices = self.prices.values
+        frame = slice(self.frame_bound[0] - self.window_size, self.frame_bound[1])
+        prices = self.prices.values[frame]
 
         # signal_features = self.signal_features.T
-        signal_features = self.df.values
+        signal_features = self.df.values[frame]
 
         return prices.astype(np.float32), signal_features.astype(np.float32)
 
@@ -62,9 +73,14 @@ class CryptoEnv(StocksEnv):
         ):
             current_reward = self._reward_calculator.reward(self._reward_type)
 
-            # calculate metrics
+            # calculate metrics. A discrete trade reverses the +/-1 position,
+            # i.e. orders 2 units: a 1 unit order would only close it, leaving
+            # the new position unrecorded and every later trade unpriced.
             self._reward_calculator.update(
-                position_value, order_action, self._current_tick, self._last_trade_tick
+                position_value,
+                OrderAction(2 * order_action),
+                self._current_tick,
+                self._last_trade_tick,
             )
 
             # calculate reward
@@ -72,6 +88,17 @@ class CryptoEnv(StocksEnv):
 
             step_reward = updated_reward - current_reward
 
-            self._epoch = self.df.index[self._current_tick]
+            # ticks are relative to the frame, the index is not
+            self._epoch = self.df.index[
+                self._current_tick + self.frame_bound[0] - self.window_size
+            ]
 
         return step_reward
+
+    def replay(self, actions):
+        """Whole episode of `actions` at once, see `gym_anytrading.replay`."""
+        return replay(self, actions)
+
+    def oracle_actions(self):
+        """Fee-aware hindsight actions and positions, see `gym_anytrading.oracle`."""
+        return oracle_actions(self)
@@ -0,0 +1,51 @@
+"""CryptoEnv Test"""
+
+import numpy as np
+import pytest
+
+from gym_anytrading.datasets import CRYPTO_ETHUSDT_5M
+from gym_anytrading.envs import CryptoEnv
+from gym_anytrading.reward import RewardCalculator
+from gym_anytrading.typedefs import Actions, RewardType
+
+
+def test_discrete_trades_reverse_the_position():
+    df = CRYPTO_ETHUSDT_5M.iloc[:100]
+    env = CryptoEnv(
+        df.Close,
+        df.High,
+        df.Low,
+        df,
+        window_size=10,
+        frame_bound=(10, len(df)),
+        trade_fee=0.0,
+        reward_type=RewardType.LogReturns,
+    )
+    ask, bid = df.High.to_numpy(), df.Low.to_numpy()
+
+    # buy at the first step, sell at tick 15, buy at tick 20
+    env.reset(seed=0)
+    rewards = {}
+    for tick in range(env._start_tick + 1, 21):
+        action = Actions.Sell.value if 15 <= tick < 20 else Actions.Buy.value
+        rewards[tick] = env.step(action)[1]
+        assert env._current_tick == tick
+
+    # each trade closes the previous one at its own entry price
+    first = env._start_tick + 1
+    assert rewards[first] == 0.0  # the initial short has no entry
+    assert rewards[15] == pytest.approx(np.log(bid[15] / ask[first]))
+    assert rewards[20] == pytest.approx(np.log(2 - ask[20] / bid[15]))
+    assert all(reward == 0.0 for tick, reward in rewards.items() if tick % 5)
+
+    # with 1 unit orders (the former behaviour), a trade only closes the
+    # position and the new one is never recorded: no trade is ever priced
+    calculator = RewardCalculator(0.0, 0.0, ask=ask, bid=bid)
+    for position, order_action, tick, last_trade_tick in [
+        (-1.0, 1.0, first, first - 1),
+        (1.0, -1.0, 15, first),
+        (-1.0, 1.0, 20, 15),
+    ]:
+        calculator.update(position, order_action, tick, last_trade_tick)
+        assert calculator.reward(RewardType.LogReturns) == 0.0
+    assert calculator.get_info()["Trades"] == 0.0
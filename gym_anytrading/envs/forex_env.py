@@ -1,6 +1,7 @@
 import numpy as np
 
 from .trading_env import TradingEnv, Actions, Positions, RewardType
+from ..oracle import best_round_trips, monotone_runs
 
 
 class ForexEnv(TradingEnv):
@@ -21,7 +22,12 @@ class ForexEnv(TradingEnv):
 
         self.frame_bound = frame_bound
         self.unit_side = unit_side.lower()
+        self.trade_fee = trade_fee_ask_percent  # unit (price), not percent
+        prices = df.loc[:, "Close"]
         super().__init__(
+            prices,
+            prices,
+            prices,
             df,
             window_size,
             render_mode,
@@ -31,7 +37,7 @@ class ForexEnv(TradingEnv):
         )
 
     def _process_data(self):
-        prices = self.df.loc[:, "Close"].to_numpy()
+        prices = self.prices.to_numpy()
 
         prices[
             self.frame_bound[0] - self.window_size
@@ -85,41 +91,37 @@ class ForexEnv(TradingEnv):
                     quantity = self._total_profit / last_trade_price
                     self._total_profit = quantity * (current_price - self.trade_fee)
 
-    def max_possible_profit(self):
-        current_tick = self._start_tick
-        last_trade_tick = current_tick - 1
-        profit = 1.0
-
-        while current_tick <= self._end_tick:
-            position = None
-            if self.prices[current_tick] < self.prices[current_tick - 1]:
-                while (
-                    current_tick <= self._end_tick
-                    and self.prices[current_tick] < self.prices[current_tick - 1]
-                ):
-                    current_tick += 1
-                position = Positions.Short
-            else:
-                while (
-                    current_tick <= self._end_tick
-                    and self.prices[current_tick] >= self.prices[current_tick - 1]
-                ):
-                    current_tick += 1
-                position = Positions.Long
-
-            current_price = self.prices[current_tick - 1]
-            last_trade_price = self.prices[last_trade_tick]
+    def max_possible_profit(self, fee_aware=False):
+        """Profit of the best short ("left" unit side) or long ("right") trades,
+        compounded from 1.0.
 
+        `trade_fee` is charged on a trade of every falling (rising) run unless
+        `fee_aware`, then only the trades that pay for it are taken.
+        """
+        prices = self.prices.astype(np.float64)
+        entry_ticks, exit_ticks, rising = monotone_runs(
+            prices, self._start_tick, self._end_tick
+        )
+        if not fee_aware:
             if self.unit_side == "left":
-                if position == Positions.Short:
-                    quantity = profit * (last_trade_price - self.trade_fee)
-                    profit = quantity / current_price
-
-            elif self.unit_side == "right":
-                if position == Positions.Long:
-                    quantity = profit / last_trade_price
-                    profit = quantity * (current_price - self.trade_fee)
-
-            last_trade_tick = current_tick - 1
-
-        return profit
+                runs = ~rising
+                growth = (prices[entry_ticks[runs]] - self.trade_fee) / prices[
+                    exit_ticks[runs]
+                ]
+            else:
+                runs = rising
+                growth = (prices[exit_ticks[runs]] - self.trade_fee) / prices[
+                    entry_ticks[runs]
+                ]
+            return float(np.prod(growth))
+
+        pivot_prices = prices[np.append(entry_ticks[:1], exit_ticks)]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # a price not above the fee can never be traded (log -inf)
+            log_net_prices = np.log(np.maximum(pivot_prices - self.trade_fee, 0.0))
+        log_prices = np.log(pivot_prices)
+        if self.unit_side == "left":
+            log_growth = best_round_trips(log_net_prices, -log_prices)
+        else:
+            log_growth = best_round_trips(-log_prices, log_net_prices)
+        return float(np.exp(log_growth))
@@ -8,9 +8,11 @@ import matplotlib.pyplot as plt
 
 import gymnasium as gym
 from ..typedefs import Positions, Actions, RewardType
-from ..reward import RewardCalculator
+from ..reward import RewardCalculator, check_info_keys, check_reward_type
+from ..history import History, check_history_retention
 
 INF = 1e10
+OBSERVATION_MODES = ("window", "copy", "index")
 
 
 class TradingEnv(gym.Env):
@@ -29,13 +31,33 @@ class TradingEnv(gym.Env):
         trade_fee_ask_percent=0.0,
         trade_fee_bid_percent=0.0,
         box_range: Tuple[float, float] = (-INF, INF),
+        info_keys=None,
+        history_retention="full",
+        mark_to_market=False,
+        observation_mode="window",
     ):
         assert df.ndim == 2
         assert render_mode is None or render_mode in self.metadata["render_modes"]
         assert box_range[0] < box_range[1], "box_range should be a tuple (low, high)"
 
         self.render_mode = render_mode
-        self._reward_type = reward_type
+        self._reward_type = check_reward_type(reward_type, mark_to_market)
+        # info keys returned by step/reset: None for all, () for none
+        self._info_keys = check_info_keys(info_keys, mark_to_market)
+        # "off", "summary", last K steps (int) or "full", see `History`
+        self._history_retention = check_history_retention(history_retention)
+        # revalue the open position every tick: dense rewards over whole steps
+        self._mark_to_market = mark_to_market
+        # "window": read-only (window_size, F) views of signal_features,
+        # "copy": the window copied into a buffer owned by the env (writable,
+        # overwritten by the next step), "index": the tick and the position
+        # only, for replay buffers that `gather` windows in batches
+        if observation_mode not in OBSERVATION_MODES:
+            raise ValueError(
+                f"observation_mode must be one of {OBSERVATION_MODES}, "
+                f"got {observation_mode!r}"
+            )
+        self._observation_mode = observation_mode
         self._trade_fee_ask_percent = trade_fee_ask_percent
         self._trade_fee_bid_percent = trade_fee_bid_percent
 
@@ -43,27 +65,49 @@ class TradingEnv(gym.Env):
         self.df = df[df.columns[~df.columns.isin([prices.name, ask.name, bid.name])]]
         self.window_size = window_size
         self.prices, self.signal_features = self._process_data()
+        # observations are zero-copy views, which must not modify the data
+        self.signal_features.flags.writeable = False
         self.shape = (window_size, len(self.df.columns))
+        self._observation = None
+        if observation_mode == "copy":
+            self._observation = np.empty(self.shape, self.signal_features.dtype)
+        # windows[i] is the observation window starting at tick i (a view)
+        self._windows = np.lib.stride_tricks.sliding_window_view(
+            self.signal_features, window_size, axis=0
+        ).transpose(0, 2, 1)
 
         # reward calculator setup
         self._reward_calculator = RewardCalculator(
-            prices=self.prices,
+            prices=prices,
             ask=ask,
             bid=bid,
+            frame_bound=getattr(self, "frame_bound", None),
+            window_size=window_size,
             trade_fee_ask_percent=trade_fee_ask_percent,
             trade_fee_bid_percent=trade_fee_bid_percent,
+            mark_to_market=mark_to_market,
         )
 
         # spaces
         self.action_space = gym.spaces.Discrete(
             len([Actions.Buy, Actions.Sell]), start=Actions.Buy.value
         )
-        self.observation_space = gym.spaces.Box(
-            low=box_range[0],
-            high=box_range[1],
-            shape=self.shape,
-            dtype=np.float32,
-        )
+        if observation_mode == "index":
+            self.observation_space = gym.spaces.Dict(
+                {
+                    "tick": gym.spaces.Discrete(len(self.signal_features)),
+                    "position": gym.spaces.Box(
+                        low=-1, high=1, shape=(1,), dtype=np.float32
+                    ),
+                }
+            )
+        else:
+            self.observation_space = gym.spaces.Box(
+                low=box_range[0],
+                high=box_range[1],
+                shape=self.shape,
+                dtype=np.float32,
+            )
 
         # episode
         self._start_tick = self.window_size - 1
@@ -72,7 +116,10 @@ class TradingEnv(gym.Env):
         self._current_tick = None
         self._last_trade_tick = None
         self._position = None
+        # position at each tick: +1 long, -1 short, 0 before the episode start
         self._position_history = None
+        if self._history_retention not in ("off", "summary"):
+            self._position_history = np.zeros(self._end_tick + 1, dtype=np.int8)
         # self._total_profit = None
         self._first_rendering = None
         self.history = None
@@ -89,10 +136,13 @@ class TradingEnv(gym.Env):
         self._current_tick = self._start_tick
         self._last_trade_tick = self._current_tick - 1
         self._position = Positions.Short
-        self._position_history = (self.window_size * [None]) + [self._position]
+        if self._position_history is not None:
+            self._position_history.fill(0)
+            self._position_history[self._current_tick] = 1 - 2 * self._position.value
 
         self._first_rendering = True
-        self.history = {}
+        if self.history is not None:
+            self.history.clear()
 
         observation = self._get_observation()
         info = self._get_info()
@@ -109,6 +159,9 @@ class TradingEnv(gym.Env):
         if self._current_tick == self._end_tick:
             self._truncated = True
 
+        if self._mark_to_market:
+            start_reward = self._reward_calculator.reward(self._reward_type)
+
         step_reward = self._calculate_reward(action)
 
         # self._update_profit(action)
@@ -123,10 +176,18 @@ class TradingEnv(gym.Env):
             self._position = self._position.opposite()
             self._last_trade_tick = self._current_tick
 
-        self._position_history.append(self._position)
+        if self._mark_to_market:
+            self._reward_calculator.mark_to_market(self._current_tick)
+            step_reward = (
+                self._reward_calculator.reward(self._reward_type) - start_reward
+            )
+
+        if self._position_history is not None:
+            self._position_history[self._current_tick] = 1 - 2 * self._position.value
         observation = self._get_observation()
         info = self._get_info()
-        self._update_history(info)
+        if self._history_retention != "off":
+            self._update_history(info)
 
         if self.render_mode == "human":
             self._render_frame()
@@ -134,19 +195,38 @@ class TradingEnv(gym.Env):
         return observation, step_reward, False, self._truncated, info
 
     def _get_info(self):
-        return self._reward_calculator.get_info()
+        return self._reward_calculator.get_info(self._info_keys)
 
     def _get_observation(self):
-        return self.signal_features[
+        if self._observation_mode == "index":
+            return {
+                "tick": np.int64(self._current_tick),
+                "position": np.array([1 - 2 * self._position.value], dtype=np.float32),
+            }
+        window = self.signal_features[
             (self._current_tick - self.window_size + 1) : self._current_tick + 1
         ]
+        if self._observation is not None:
+            self._observation[:] = window
+            return self._observation
+        return window
+
+    def gather(self, ticks):
+        """Observation windows ending at `ticks` (e.g. the "tick" of a batch
+        of "index" observations), `ticks.shape + (window_size, F)`."""
+        ticks = np.asarray(ticks, dtype=np.int64)
+        first, last = self.window_size - 1, len(self.signal_features) - 1
+        if ticks.size and (ticks.min() < first or ticks.max() > last):
+            raise IndexError(f"ticks must be in [{first}, {last}]")
+        return self._windows[ticks - first]
 
     def _update_history(self, info):
-        if not self.history:
-            self.history = {key: [] for key in info.keys()}
+        if self.history is None:
+            self.history = History.for_retention(
+                self._history_retention, info, self._end_tick - self._start_tick
+            )
 
-        for key, value in info.items():
-            self.history[key].append(value)
+        self.history.append(info)
 
     def _render_frame(self):
         self.render()
@@ -155,9 +235,9 @@ class TradingEnv(gym.Env):
 
         def _plot_position(position, tick):
             color = None
-            if position == Positions.Short:
+            if position < 0:
                 color = "red"
-            elif position == Positions.Long:
+            elif position > 0:
                 color = "green"
             if color:
                 plt.scatter(tick, self.prices[tick], color=color)
@@ -168,10 +248,11 @@ class TradingEnv(gym.Env):
             self._first_rendering = False
             plt.cla()
             plt.plot(self.prices)
-            start_position = self._position_history[self._start_tick]
-            _plot_position(start_position, self._start_tick)
+            if self._position_history is not None:
+                start_position = self._position_history[self._start_tick]
+                _plot_position(start_position, self._start_tick)
 
-        _plot_position(self._position, self._current_tick)
+        _plot_position(1 - 2 * self._position.value, self._current_tick)
 
         plt.suptitle(
             "Total Reward: %.6f" % self._reward_calculator.reward(self._reward_type)
@@ -188,19 +269,14 @@ class TradingEnv(gym.Env):
         plt.pause(pause_time)
 
     def render_all(self, title=None):
-        window_ticks = np.arange(len(self._position_history))
         plt.plot(self.prices)
 
-        short_ticks = []
-        long_ticks = []
-        for i, tick in enumerate(window_ticks):
-            if self._position_history[i] == Positions.Short:
-                short_ticks.append(tick)
-            elif self._position_history[i] == Positions.Long:
-                long_ticks.append(tick)
-
-        plt.plot(short_ticks, self.prices[short_ticks], "ro")
-        plt.plot(long_ticks, self.prices[long_ticks], "go")
+        # positions are not recorded with history_retention "off"/"summary"
+        if self._position_history is not None:
+            short_ticks = np.flatnonzero(self._position_history < 0)
+            long_ticks = np.flatnonzero(self._position_history > 0)
+            plt.plot(short_ticks, self.prices[short_ticks], "ro")
+            plt.plot(long_ticks, self.prices[long_ticks], "go")
 
         if title:
             plt.title(title)
@@ -226,5 +302,5 @@ class TradingEnv(gym.Env):
     def _calculate_reward(self, action):
         raise NotImplementedError
 
-    def max_possible_profit(self):  # trade fees are ignored
+    def max_possible_profit(self, fee_aware=False):  # fees only if fee_aware
         raise NotImplementedError
@@ -0,0 +1,175 @@
+"""TradingEnv Test"""
+
+import numpy as np
+import pytest
+
+from gym_anytrading.datasets import CRYPTO_ETHUSDT_5M
+from gym_anytrading import envs, envsC
+from gym_anytrading.typedefs import RewardType
+
+
+def _position(env):
+    if isinstance(env, envsC.CryptoEnv):
+        return env._position
+    return 1 - 2 * env._position.value
+
+
+@pytest.mark.parametrize(
+    "env_class, actions",
+    [(envs.CryptoEnv, [0, 1]), (envsC.CryptoEnv, [[-0.5], [0.5], [1.0]])],
+)
+def test_index_observations(env_class, actions):
+    df = CRYPTO_ETHUSDT_5M.iloc[:100]
+    kwargs = dict(window_size=10, frame_bound=(10, len(df)))
+    env = env_class(df.Close, df.High, df.Low, df, **kwargs)
+    index_env = env_class(
+        df.Close, df.High, df.Low, df, **kwargs, observation_mode="index"
+    )
+
+    observations = [env.reset(seed=0)[0]]
+    index_observations = [index_env.reset(seed=0)[0]]
+    positions = [_position(env)]
+    for i in np.random.default_rng(0).integers(0, len(actions), 50):
+        action = np.asarray(actions[i])
+        observations.append(env.step(action)[0])
+        index_observations.append(index_env.step(action)[0])
+        positions.append(_position(env))
+
+    for observation, position in zip(index_observations, positions):
+        assert index_env.observation_space.contains(observation)
+        assert observation["position"][0] == np.float32(position)
+
+    # one batched gather of all the windows
+    windows = index_env.gather([o["tick"] for o in index_observations])
+    assert windows.shape == (len(observations),) + env.shape
+    np.testing.assert_array_equal(windows, observations)
+
+    # ticks without a whole window are rejected, not wrapped around
+    first, last = index_env.window_size - 1, len(index_env.signal_features) - 1
+    assert index_env.gather([first, last]).shape == (2,) + env.shape
+    assert index_env.gather([]).shape == (0,) + env.shape
+    for ticks in [[first - 1], [0, first], [last + 1]]:
+        with pytest.raises(IndexError):
+            index_env.gather(ticks)
+
+    with pytest.raises(ValueError):
+        env_class(df.Close, df.High, df.Low, df, **kwargs, observation_mode="ticks")
+
+
+@pytest.mark.parametrize(
+    "env_class, actions", [(envs.CryptoEnv, [0, 1]), (envsC.CryptoEnv, [[-1.0], [1.0]])]
+)
+def test_epoch_frame_offset(env_class, actions):
+    # ticks start at frame_bound[0] - window_size = 40 in the index of df
+    df = CRYPTO_ETHUSDT_5M.iloc[:100]
+    env = env_class(
+        df.Close, df.High, df.Low, df, window_size=10, frame_bound=(50, len(df))
+    )
+    env.reset(seed=0)
+    for action in actions:
+        env.step(np.asarray(action))
+        row = env._current_tick + 40
+        assert env._epoch == df.index[row]
+        assert env._reward_calculator._ask[env._current_tick] == df.High.iloc[row]
+
+
+@pytest.mark.parametrize("env_class", [envs.CryptoEnv, envsC.CryptoEnv])
+def test_observation_copy_semantics(env_class):
+    df = CRYPTO_ETHUSDT_5M.iloc[:100]
+    kwargs = dict(window_size=10, frame_bound=(10, len(df)))
+    env = env_class(df.Close, df.High, df.Low, df, **kwargs)
+    copy_env = env_class(
+        df.Close, df.High, df.Low, df, **kwargs, observation_mode="copy"
+    )
+    action = np.array([0.0]) if env_class is envsC.CryptoEnv else 0
+
+    # zero-copy views that cannot corrupt the features
+    observation, _ = env.reset(seed=0)
+    assert np.shares_memory(observation, env.signal_features)
+    with pytest.raises(ValueError):
+        observation -= observation.mean()
+
+    # a writable copy in one reused buffer
+    buffer, _ = copy_env.reset(seed=0)
+    assert buffer.flags.writeable
+    assert not np.shares_memory(buffer, copy_env.signal_features)
+    np.testing.assert_array_equal(buffer, observation)
+    buffer -= buffer.mean()
+    for _ in range(3):
+        observation = env.step(action)[0]
+        copied = copy_env.step(action)[0]
+        assert copied is buffer
+        np.testing.assert_array_equal(copied, observation)
+    assert copy_env.observation_space.contains(buffer)
+
+
+@pytest.mark.parametrize(
+    "actions",
+    [
+        [[1.0], [-1.0]],  # closed to flat
+        [[1.0], [-0.5], [-0.5]],  # closed in two parts
+    ],
+)
+def test_mark_to_market_flat(actions):
+    df = CRYPTO_ETHUSDT_5M.iloc[:100]
+    env = envsC.CryptoEnv(
+        df.Close,
+        df.High,
+        df.Low,
+        df,
+        window_size=10,
+        frame_bound=(10, len(df)),
+        reward_type=RewardType.EquityLogReturns,
+        mark_to_market=True,
+    )
+    env.reset(seed=0)
+    for action in actions:
+        _, reward, _, _, info = env.step(np.array(action))
+        if env._position != 0.0:
+            # the open part is valued at the average entry price
+            assert info["LogEquity"] != info["LogReturns"]
+    assert env._position == 0.0
+
+    # flat: no phantom position to revalue
+    for _ in range(10):
+        _, reward, _, _, info = env.step(np.array([0.0]))
+        assert reward == 0.0
+        assert info["LogEquity"] == info["LogReturns"]
+        assert info["Trades"] == len(actions) - 1
+
+
+def test_mark_to_market_scale_in():
+    df = CRYPTO_ETHUSDT_5M.iloc[:100]
+    ask, bid = df.High.to_numpy(), df.Low.to_numpy()
+    env = envsC.CryptoEnv(
+        df.Close,
+        df.High,
+        df.Low,
+        df,
+        window_size=10,
+        frame_bound=(10, len(df)),
+        trade_fee=0.0,
+        reward_type=RewardType.EquityLogReturns,
+        mark_to_market=True,
+    )
+    env.reset(seed=0)
+    entries = []
+    for action in [0.5, 0.5, 0.0, 0.0, 0.0]:
+        _, reward, _, _, info = env.step(np.array([action]))
+        if action:
+            entries.append(ask[env._current_tick])
+        # the whole position is in the entry, valued at its average price
+        assert env._reward_calculator._quantity == env._position
+        unrealized_pl = (bid[env._current_tick] - np.mean(entries)) * env._position
+        assert info["LogEquity"] - info["LogReturns"] == pytest.approx(
+            np.log1p(unrealized_pl / entries[0])
+        )
+    assert env._position == 1.0
+
+    _, reward, _, _, info = env.step(np.array([-1.0]))
+    assert env._position == 0.0
+    assert env._reward_calculator._quantity == 0.0
+    assert info["Trades"] == 1.0
+    assert info["Profit"] + info["Loss"] == pytest.approx(
+        bid[env._current_tick] - np.mean(entries)
+    )
@@ -1,5 +1,11 @@
+import os
+import tempfile
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 from tqdm import tqdm
 
 from typing import Tuple
@@ -11,9 +17,52 @@ from pyts.image import RecurrencePlot
 
 INF = 1e10
 
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+def _recurrence_plots(values, window_size, params, start, stop, compact=False):
+    """Recurrence plots of the windows `values[i : i + window_size]`, i in [start, stop).
+
+    pyts transforms every row independently, so a chunk of windows in one
+    call gives the same images as one call per window.
+    """
+    # windows[i] is the (n_features, window_size) slice values[i : i + window_size]
+    windows = sliding_window_view(values, window_size, axis=0)[start:stop]
+    n_windows, n_features = windows.shape[:2]
+    # pyts' numba kernels reject read-only views
+    windows = np.require(windows.reshape(-1, window_size), requirements="W")
+    images = RecurrencePlot(**params).fit_transform(windows)
+    images = images.reshape(n_windows, n_features, window_size, window_size)
+    if compact:
+        # binary plots are symmetric: the upper triangle is enough
+        triu = np.triu_indices(window_size)
+        images = np.packbits(images[..., triu[0], triu[1]] != 0, axis=-1)
+    return images
+
+
+# state of a `CryptoEnv._process_data_parallel` worker
+_worker_args = None
+
+
+def _init_worker(*args):
+    global _worker_args
+    _worker_args = args
+
+
+def _write_recurrence_plots(start, stop):
+    values, window_size, params, compact, path, dtype, shape = _worker_args
+    signal_features = np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+    signal_features[start:stop] = _recurrence_plots(
+        values, window_size, params, start, stop, compact
+    )
+    signal_features.flush()
+    return stop - start
+
 
 class CryptoEnv(StocksEnv):
 
+    CHUNK_SIZE = 1024  # windows per RecurrencePlot call
+
     def __init__(
         self,
         prices: pd.Series,
@@ -27,12 +76,40 @@ class CryptoEnv(StocksEnv):
         render_mode=None,
         reward_type=RewardType.Profit,
         box_range: Tuple[float, float] = (-INF, INF),
+        info_keys=None,
+        history_retention="full",
+        mark_to_market=False,
+        features_cache_dir=None,
+        observation_cache_size=None,
+        recurrence_plot_params=None,
+        compact_features=False,
+        n_jobs=1,
     ):
         assert len(frame_bound) == 2
+        assert (
+            observation_cache_size is None or features_cache_dir is None
+        ), "on-demand observations can't be stored in features_cache_dir"
+        assert not compact_features or (
+            (recurrence_plot_params or {}).get("threshold") is not None
+        ), "compact_features needs a binary RecurrencePlot (set a threshold)"
+        assert (
+            not compact_features or observation_cache_size is None
+        ), "compact_features only applies to precomputed observations"
+        if not (n_jobs == -1 or n_jobs >= 1):
+            raise ValueError(f"n_jobs must be -1 or a positive int, got {n_jobs!r}")
 
         # self.signal_features = signal_features
 
         self.frame_bound = frame_bound
+        # None: precompute every recurrence plot in `_process_data`.
+        # int: compute them on demand, keeping the last N in an LRU cache.
+        self.observation_cache_size = observation_cache_size
+        self.recurrence_plot_params = recurrence_plot_params or {}
+        # Store each binary plot as the packed bits of its upper triangle
+        # (n_windows, n_features, n_bytes) uint8 instead of float32 images.
+        self.compact_features = compact_features
+        self._triu = np.triu_indices(window_size)
+        self.n_jobs = n_jobs  # processes computing the plots, -1: all cores
         self.leverage = leverage  # Forex: 10000 [Unit]. Crypto: leverage etc...
         super().__init__(
             prices,
@@ -46,26 +123,141 @@ class CryptoEnv(StocksEnv):
             trade_fee_ask_percent=trade_fee,
             trade_fee_bid_percent=trade_fee,
             box_range=box_range,
+            info_keys=info_keys,
+            history_retention=history_retention,
+            mark_to_market=mark_to_market,
+            features_cache_dir=features_cache_dir,
         )
 
+    def _price_frame(self):
+        # prices[t] is the row after the window t, whatever the frame_bound
+        return (self.window_size, len(self.df)), 0
+
     def _process_data(self):
         prices = self.prices.values[self.window_size :]
 
-        batches = [
-            [*self.df.index[i - self.window_size : i]]
-            for i in range(self.window_size, len(self.df))
-        ]
+        values = self.df.values
+        n_windows = len(values) - self.window_size
+        n_features = values.shape[1]
 
-        transformer = RecurrencePlot()
+        if self.observation_cache_size is not None:
+            self._values = values
+            # LRU cache of the observations by tick, owned by the env
+            self._observation_cache = OrderedDict()
+            self._observation_cache_hits = self._observation_cache_misses = 0
+            return prices.astype(np.float32), None
 
-        signal_features = []
-        for batch in tqdm(batches):
-            signal_features += [transformer.fit_transform(self.df.loc[batch].T)]
+        if self.compact_features:
+            n_bytes = (len(self._triu[0]) + 7) // 8
+            shape, dtype = (n_windows, n_features, n_bytes), np.uint8
+        else:
+            shape = (n_windows, n_features, self.window_size, self.window_size)
+            dtype = np.float32
 
-        signal_features = np.array(signal_features).reshape(
-            len(batches), self.window_size, self.window_size, -1
+        args = (values, self.window_size, self.recurrence_plot_params)
+        if self.n_jobs == 1:
+            signal_features = np.empty(shape, dtype)
+            with tqdm(total=n_windows) as progress:
+                for start in range(0, n_windows, self.CHUNK_SIZE):
+                    stop = min(start + self.CHUNK_SIZE, n_windows)
+                    signal_features[start:stop] = _recurrence_plots(
+                        *args, start, stop, self.compact_features
+                    )
+                    progress.update(stop - start)
+        else:
+            signal_features = self._process_data_parallel(args, shape, dtype)
+
+        if self.compact_features:
+            return prices.astype(np.float32), signal_features
+
+        signal_features = signal_features.reshape(
+            n_windows, self.window_size, self.window_size, -1
         )
-        return prices.astype(np.float32), signal_features.astype(np.float32)
+        return prices.astype(np.float32), signal_features
+
+    def _process_data_parallel(self, args, shape, dtype):
+        """Compute the chunks in a process pool, straight into a shared mapping.
+
+        Workers write their chunk into a memory-mapped temporary file (in
+        /dev/shm when available), so no image array is pickled back to the
+        parent. The file is unlinked once the mapping is open.
+        """
+        n_jobs = os.cpu_count() if self.n_jobs == -1 else self.n_jobs
+        n_windows = shape[0]
+        tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        fd, path = tempfile.mkstemp(dir=tmp_dir, prefix="gym_anytrading-")
+        os.close(fd)
+        try:
+            signal_features = np.memmap(path, dtype=dtype, mode="w+", shape=shape)
+            with ProcessPoolExecutor(
+                n_jobs,
+                initializer=_init_worker,
+                initargs=(*args, self.compact_features, path, dtype, shape),
+            ) as pool:
+                futures = [
+                    pool.submit(
+                        _write_recurrence_plots,
+                        start,
+                        min(start + self.CHUNK_SIZE, n_windows),
+                    )
+                    for start in range(0, n_windows, self.CHUNK_SIZE)
+                ]
+                with tqdm(total=n_windows) as progress:
+                    for future in as_completed(futures):
+                        progress.update(future.result())
+        finally:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        return np.asarray(signal_features)
+
+    def _unpack_recurrence_plot(self, packed):
+        bits = np.unpackbits(packed, axis=-1, count=len(self._triu[0]))
+        signal_features = np.empty(
+            (len(packed), self.window_size, self.window_size), dtype=np.float32
+        )
+        signal_features[:, self._triu[0], self._triu[1]] = bits
+        signal_features[:, self._triu[1], self._triu[0]] = bits
+        return signal_features.reshape(self.window_size, self.window_size, -1)
+
+    def _recurrence_plot(self, tick):
+        cache = self._observation_cache
+        signal_features = cache.get(tick)
+        if signal_features is not None:
+            self._observation_cache_hits += 1
+            cache.move_to_end(tick)
+            return signal_features
+        self._observation_cache_misses += 1
+        signal_features = cache[tick] = self._compute_recurrence_plot(tick)
+        if len(cache) > self.observation_cache_size:
+            cache.popitem(last=False)
+        return signal_features
+
+    def _compute_recurrence_plot(self, tick):
+        signal_features = _recurrence_plots(
+            self._values, self.window_size, self.recurrence_plot_params, tick, tick + 1
+        )
+        signal_features = signal_features.reshape(
+            self.window_size, self.window_size, -1
+        ).astype(np.float32)
+        signal_features.flags.writeable = False  # shared through the LRU cache
+        return signal_features
+
+    def observation_cache_info(self):
+        """Hits, misses and size of the on-demand recurrence plot cache."""
+        assert self.observation_cache_size is not None, "observations are precomputed"
+        return CacheInfo(
+            self._observation_cache_hits,
+            self._observation_cache_misses,
+            self.observation_cache_size,
+            len(self._observation_cache),
+        )
+
+    def _features_params(self):
+        return RecurrencePlot(**self.recurrence_plot_params).get_params() | {
+            "compact_features": self.compact_features
+        }
 
     def _calculate_reward(self, action):
         step_reward = 0.0  # pip
@@ -78,9 +270,14 @@ class CryptoEnv(StocksEnv):
         ):
             current_reward = self._reward_calculator.reward(self._reward_type)
 
-            # calculate metrics
+            # calculate metrics. A discrete trade reverses the +/-1 position,
+            # i.e. orders 2 units: a 1 unit order would only close it, leaving
+            # the new position unrecorded and every later trade unpriced.
             self._reward_calculator.update(
-                position_value, order_action, self._current_tick, self._last_trade_tick
+                position_value,
+                OrderAction(2 * order_action),
+                self._current_tick,
+                self._last_trade_tick,
             )
 
             # calculate reward
@@ -88,9 +285,18 @@ class CryptoEnv(StocksEnv):
 
             step_reward = updated_reward - current_reward
 
-            self._epoch = self.df.index[self._current_tick]
+            frame_bound, window_size = self._price_frame()
+            self._epoch = self.df.index[
+                self._current_tick + frame_bound[0] - window_size
+            ]
 
         return step_reward
 
     def _get_observation(self):
+        if self.observation_cache_size is not None:
+            return self._recurrence_plot(self._current_tick)
+        if self.compact_features:
+            return self._unpack_recurrence_plot(
+                self.signal_features[self._current_tick]
+            )
         return self.signal_features[self._current_tick]
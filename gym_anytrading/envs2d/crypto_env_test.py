@@ -0,0 +1,130 @@
+"""envs2d CryptoEnv Test"""
+
+import weakref
+
+import numpy as np
+import pytest
+from pyts.image import RecurrencePlot
+
+from gym_anytrading.datasets import CRYPTO_ETHUSDT_5M
+from gym_anytrading import envs2d
+
+WINDOW_SIZE = 10
+
+
+def _make_env(df=None, **kwargs):
+    df = CRYPTO_ETHUSDT_5M.iloc[:300] if df is None else df
+    return envs2d.CryptoEnv(
+        df.Close,
+        df.High,
+        df.Low,
+        df,
+        window_size=WINDOW_SIZE,
+        frame_bound=(WINDOW_SIZE, len(df)),
+        **kwargs,
+    )
+
+
+def _recurrence_plot_loop(env, **params):
+    # one RecurrencePlot call per window, as before the batched computation
+    transformer = RecurrencePlot(**params)
+    images = [
+        transformer.fit_transform(env.df.iloc[i - WINDOW_SIZE : i].T)
+        for i in range(WINDOW_SIZE, len(env.df))
+    ]
+    return (
+        np.array(images)
+        .reshape(len(images), WINDOW_SIZE, WINDOW_SIZE, -1)
+        .astype(np.float32)
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [envs2d.CryptoEnv.CHUNK_SIZE, 64])
+def test_batched_recurrence_plots(chunk_size, monkeypatch):
+    # 290 windows: one partial chunk, or four full chunks and a partial one
+    monkeypatch.setattr(envs2d.CryptoEnv, "CHUNK_SIZE", chunk_size)
+    env = _make_env()
+    np.testing.assert_array_equal(env.signal_features, _recurrence_plot_loop(env))
+
+
+def test_on_demand_observations():
+    env = _make_env()
+    lazy_env = _make_env(observation_cache_size=8)
+    assert lazy_env.signal_features is None
+
+    ticks = range(lazy_env._start_tick, lazy_env._end_tick + 1)
+    for tick in ticks:
+        lazy_env._current_tick = env._current_tick = tick
+        observation = lazy_env._get_observation()
+        assert not observation.flags.writeable
+        np.testing.assert_array_equal(observation, env._get_observation())
+    assert lazy_env.observation_cache_info() == (0, len(ticks), 8, 8)
+
+    # the last 8 ticks are cached, older ones were evicted
+    lazy_env._current_tick = ticks[-8]
+    lazy_env._get_observation()
+    lazy_env._current_tick = ticks[0]
+    lazy_env._get_observation()
+    assert lazy_env.observation_cache_info() == (1, len(ticks) + 1, 8, 8)
+
+    # the cache does not keep the env alive
+    lazy_env = weakref.ref(lazy_env)
+    assert lazy_env() is None
+
+
+def test_price_frame():
+    # prices[t] is the row after the window t, and so are ask, bid and the epoch
+    df = CRYPTO_ETHUSDT_5M.iloc[:300]
+    env = _make_env(df, observation_cache_size=8)
+    env.reset(seed=0)
+    for action in [0, 1]:
+        env.step(action)
+        row = env._current_tick + WINDOW_SIZE
+        assert env.prices[env._current_tick] == np.float32(df.Close.iloc[row])
+        assert env._reward_calculator._ask[env._current_tick] == df.High.iloc[row]
+        assert env._reward_calculator._bid[env._current_tick] == df.Low.iloc[row]
+        assert env._epoch == df.index[row]
+
+
+def test_compact_features():
+    params = {"threshold": "point", "percentage": 20}
+    env = _make_env(recurrence_plot_params=params)
+    compact_env = _make_env(recurrence_plot_params=params, compact_features=True)
+
+    # packed upper triangles: 55 bits in 7 bytes per window and feature
+    assert compact_env.signal_features.dtype == np.uint8
+    assert compact_env.signal_features.shape == (290, 3, 7)
+    np.testing.assert_array_equal(
+        env.signal_features, _recurrence_plot_loop(env, **params)
+    )
+    for tick in range(env._start_tick, env._end_tick + 1):
+        env._current_tick = compact_env._current_tick = tick
+        observation = compact_env._get_observation()
+        assert observation.dtype == np.float32
+        np.testing.assert_array_equal(observation, env._get_observation())
+
+    with pytest.raises(AssertionError):
+        _make_env(compact_features=True)
+    with pytest.raises(AssertionError):
+        _make_env(
+            recurrence_plot_params=params,
+            compact_features=True,
+            observation_cache_size=8,
+        )
+
+
+@pytest.mark.parametrize("compact_features", [False, True])
+def test_parallel_recurrence_plots(compact_features, monkeypatch):
+    monkeypatch.setattr(envs2d.CryptoEnv, "CHUNK_SIZE", 64)
+    kwargs = dict(
+        recurrence_plot_params={"threshold": "point", "percentage": 20},
+        compact_features=compact_features,
+    )
+    env = _make_env(**kwargs)
+    parallel_env = _make_env(**kwargs, n_jobs=2)
+    assert parallel_env.signal_features.dtype == env.signal_features.dtype
+    np.testing.assert_array_equal(parallel_env.signal_features, env.signal_features)
+
+    for n_jobs in [0, -2]:
+        with pytest.raises(ValueError):
+            _make_env(n_jobs=n_jobs)
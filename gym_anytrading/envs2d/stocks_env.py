@@ -2,6 +2,7 @@ from typing import Tuple
 import numpy as np
 
 from .trading_env import TradingEnv, Actions, Positions, RewardType
+from ..oracle import best_round_trips, monotone_runs
 
 INF = 1e10
 
@@ -21,6 +22,10 @@ class StocksEnv(TradingEnv):
         trade_fee_ask_percent=0.005,
         trade_fee_bid_percent=0.01,
         box_range: Tuple[float, float] = (-INF, INF),
+        info_keys=None,
+        history_retention="full",
+        mark_to_market=False,
+        features_cache_dir=None,
     ):
         assert len(frame_bound) == 2
 
@@ -36,6 +41,10 @@ class StocksEnv(TradingEnv):
             trade_fee_ask_percent,
             trade_fee_bid_percent,
             box_range=box_range,
+            info_keys=info_keys,
+            history_retention=history_retention,
+            mark_to_market=mark_to_market,
+            features_cache_dir=features_cache_dir,
         )
 
     def _process_data(self):
@@ -98,33 +107,25 @@ class StocksEnv(TradingEnv):
     #                 shares * (1 - self.trade_fee_bid_percent)
     #             ) * current_price
 
-    def max_possible_profit(self):
-        current_tick = self._start_tick
-        last_trade_tick = current_tick - 1
-        profit = 1.0
-
-        while current_tick <= self._end_tick:
-            position = None
-            if self.prices[current_tick] < self.prices[current_tick - 1]:
-                while (
-                    current_tick <= self._end_tick
-                    and self.prices[current_tick] < self.prices[current_tick - 1]
-                ):
-                    current_tick += 1
-                position = Positions.Short
-            else:
-                while (
-                    current_tick <= self._end_tick
-                    and self.prices[current_tick] >= self.prices[current_tick - 1]
-                ):
-                    current_tick += 1
-                position = Positions.Long
-
-            if position == Positions.Long:
-                current_price = self.prices[current_tick - 1]
-                last_trade_price = self.prices[last_trade_tick]
-                shares = profit / last_trade_price
-                profit = shares * current_price
-            last_trade_tick = current_tick - 1
-
-        return profit
+    def max_possible_profit(self, fee_aware=False):
+        """Profit of the best long trades, compounded from 1.0.
+
+        Trade fees are ignored unless `fee_aware`, then only the trades that
+        pay for `trade_fee_ask_percent` and `trade_fee_bid_percent` are taken.
+        """
+        prices = self.prices.astype(np.float64)
+        entry_ticks, exit_ticks, rising = monotone_runs(
+            prices, self._start_tick, self._end_tick
+        )
+        if not fee_aware:
+            # every rising run is held long
+            return float(
+                np.prod(prices[exit_ticks[rising]] / prices[entry_ticks[rising]])
+            )
+
+        log_prices = np.log(prices[np.append(entry_ticks[:1], exit_ticks)])
+        log_growth = best_round_trips(
+            np.log1p(-self._trade_fee_ask_percent) - log_prices,
+            np.log1p(-self._trade_fee_bid_percent) + log_prices,
+        )
+        return float(np.exp(log_growth))
@@ -1,3 +1,7 @@
+import os
+import shutil
+import hashlib
+import tempfile
 from time import time
 
 from typing import Tuple
@@ -8,7 +12,8 @@ import matplotlib.pyplot as plt
 
 import gymnasium as gym
 from ..typedefs import Positions, Actions, RewardType
-from ..reward import RewardCalculator
+from ..reward import RewardCalculator, check_info_keys, check_reward_type
+from ..history import History, check_history_retention
 
 INF = 1e10
 
@@ -29,27 +34,44 @@ class TradingEnv(gym.Env):
         trade_fee_ask_percent=0.0,
         trade_fee_bid_percent=0.0,
         box_range: Tuple[float, float] = (-INF, INF),
+        info_keys=None,
+        history_retention="full",
+        mark_to_market=False,
+        features_cache_dir=None,
     ):
         assert df.ndim == 2
         assert render_mode is None or render_mode in self.metadata["render_modes"]
 
         self.render_mode = render_mode
-        self._reward_type = reward_type
+        self._reward_type = check_reward_type(reward_type, mark_to_market)
+        # info keys returned by step/reset: None for all, () for none
+        self._info_keys = check_info_keys(info_keys, mark_to_market)
+        # "off", "summary", last K steps (int) or "full", see `History`
+        self._history_retention = check_history_retention(history_retention)
+        # revalue the open position every tick: dense rewards over whole steps
+        self._mark_to_market = mark_to_market
         self._trade_fee_ask_percent = trade_fee_ask_percent
         self._trade_fee_bid_percent = trade_fee_bid_percent
 
         self.prices = prices
         self.df = df[df.columns[~df.columns.isin([prices.name, ask.name, bid.name])]]
         self.window_size = window_size
-        self.prices, self.signal_features = self._process_data()
+        if features_cache_dir is None:
+            self.prices, self.signal_features = self._process_data()
+        else:
+            self.prices, self.signal_features = self._load_features(features_cache_dir)
         self.shape = (window_size, window_size, len(self.df.columns))
 
-        # reward calculator setup
+        # reward calculator setup: ask/bid aligned with the ticks of `self.prices`
+        frame_bound, price_window_size = self._price_frame()
         self._reward_calculator = RewardCalculator(
-            ask=(ask.iloc[self.window_size :]),
-            bid=(bid.iloc[self.window_size :]),
+            ask=ask,
+            bid=bid,
+            frame_bound=frame_bound,
+            window_size=price_window_size,
             trade_fee_ask_percent=trade_fee_ask_percent,
             trade_fee_bid_percent=trade_fee_bid_percent,
+            mark_to_market=mark_to_market,
         )
 
         # spaces
@@ -71,7 +93,10 @@ class TradingEnv(gym.Env):
         self._current_tick = None
         self._last_trade_tick = None
         self._position = None
+        # position at each tick: +1 long, -1 short, 0 before the episode start
         self._position_history = None
+        if self._history_retention not in ("off", "summary"):
+            self._position_history = np.zeros(self._end_tick + 1, dtype=np.int8)
         # self._total_reward = None
         # self._total_profit = None
         self._first_rendering = None
@@ -89,10 +114,13 @@ class TradingEnv(gym.Env):
         self._current_tick = self._start_tick
         self._last_trade_tick = self._current_tick - 1
         self._position = Positions.Short
-        self._position_history = (self.window_size * [None]) + [self._position]
+        if self._position_history is not None:
+            self._position_history.fill(0)
+            self._position_history[self._current_tick] = 1 - 2 * self._position.value
 
         self._first_rendering = True
-        self.history = {}
+        if self.history is not None:
+            self.history.clear()
 
         observation = self._get_observation()
         info = self._get_info()
@@ -109,6 +137,9 @@ class TradingEnv(gym.Env):
         if self._current_tick == self._end_tick:
             self._truncated = True
 
+        if self._mark_to_market:
+            start_reward = self._reward_calculator.reward(self._reward_type)
+
         step_reward = self._calculate_reward(action)
         # self._total_reward += step_reward
 
@@ -124,10 +155,18 @@ class TradingEnv(gym.Env):
             self._position = self._position.opposite()
             self._last_trade_tick = self._current_tick
 
-        self._position_history.append(self._position)
+        if self._mark_to_market:
+            self._reward_calculator.mark_to_market(self._current_tick)
+            step_reward = (
+                self._reward_calculator.reward(self._reward_type) - start_reward
+            )
+
+        if self._position_history is not None:
+            self._position_history[self._current_tick] = 1 - 2 * self._position.value
         observation = self._get_observation()
         info = self._get_info()
-        self._update_history(info)
+        if self._history_retention != "off":
+            self._update_history(info)
 
         if self.render_mode == "human":
             self._render_frame()
@@ -135,7 +174,7 @@ class TradingEnv(gym.Env):
         return observation, step_reward, False, self._truncated, info
 
     def _get_info(self):
-        return self._reward_calculator.get_info()
+        return self._reward_calculator.get_info(self._info_keys)
 
     def _get_observation(self):
         return self.signal_features[
@@ -143,11 +182,12 @@ class TradingEnv(gym.Env):
         ]
 
     def _update_history(self, info):
-        if not self.history:
-            self.history = {key: [] for key in info.keys()}
+        if self.history is None:
+            self.history = History.for_retention(
+                self._history_retention, info, self._end_tick - self._start_tick
+            )
 
-        for key, value in info.items():
-            self.history[key].append(value)
+        self.history.append(info)
 
     def _render_frame(self):
         self.render()
@@ -156,9 +196,9 @@ class TradingEnv(gym.Env):
 
         def _plot_position(position, tick):
             color = None
-            if position == Positions.Short:
+            if position < 0:
                 color = "red"
-            elif position == Positions.Long:
+            elif position > 0:
                 color = "green"
             if color:
                 plt.scatter(tick, self.prices[tick], color=color)
@@ -169,10 +209,11 @@ class TradingEnv(gym.Env):
             self._first_rendering = False
             plt.cla()
             plt.plot(self.prices)
-            start_position = self._position_history[self._start_tick]
-            _plot_position(start_position, self._start_tick)
+            if self._position_history is not None:
+                start_position = self._position_history[self._start_tick]
+                _plot_position(start_position, self._start_tick)
 
-        _plot_position(self._position, self._current_tick)
+        _plot_position(1 - 2 * self._position.value, self._current_tick)
 
         plt.suptitle(
             "Total Reward: %.6f" % self._reward_calculator.reward(self._reward_type)
@@ -189,27 +230,22 @@ class TradingEnv(gym.Env):
         plt.pause(pause_time)
 
     def render_all(self, title=None):
-        window_ticks = np.arange(len(self._position_history))
         plt.plot(self.prices)
 
-        short_ticks = []
-        long_ticks = []
-        for i, tick in enumerate(window_ticks):
-            if self._position_history[i] == Positions.Short:
-                short_ticks.append(tick)
-            elif self._position_history[i] == Positions.Long:
-                long_ticks.append(tick)
-
-        plt.plot(short_ticks, self.prices[short_ticks], "ro")
-        plt.plot(long_ticks, self.prices[long_ticks], "go")
+        # positions are not recorded with history_retention "off"/"summary"
+        if self._position_history is not None:
+            short_ticks = np.flatnonzero(self._position_history < 0)
+            long_ticks = np.flatnonzero(self._position_history > 0)
+            plt.plot(short_ticks, self.prices[short_ticks], "ro")
+            plt.plot(long_ticks, self.prices[long_ticks], "go")
 
         if title:
             plt.title(title)
 
         plt.suptitle(
-            "Total Reward: %.6f" % self.reward(self._reward_type)
+            "Total Reward: %.6f" % self._reward_calculator.reward(self._reward_type)
             + " ~ "
-            + "Total Profit: %.6f" % self.reward(RewardType.Profit)
+            + "Total Profit: %.6f" % self._reward_calculator.reward(RewardType.Profit)
         )
 
     def close(self):
@@ -221,11 +257,77 @@ class TradingEnv(gym.Env):
     def pause_rendering(self):
         plt.show()
 
+    def _features_key(self):
+        """Hash of everything `_process_data` depends on."""
+        h = hashlib.sha1()
+        frame_bound = getattr(self, "frame_bound", None)
+        h.update(f"{type(self).__qualname__}:{self.window_size}:{frame_bound}".encode())
+        h.update(repr(sorted(self._features_params().items())).encode())
+        h.update(repr([*self.df.columns]).encode())
+        h.update(np.ascontiguousarray(self.df.values).tobytes())
+        h.update(np.ascontiguousarray(self.prices.values).tobytes())
+        return h.hexdigest()[:16]
+
+    def _load_features(self, cache_dir):
+        """`_process_data` backed by read-only memory-mapped `.npy` files.
+
+        The first env computes the features and persists them under
+        `cache_dir`; every later env (in any process) built from the same data,
+        window size and transform parameters maps the same files, so the OS
+        page cache holds a single copy shared by all of them. Entries are
+        written to a `.tmp-*` dir renamed once complete, and an entry that
+        fails to load is recomputed and replaced.
+        """
+        cache_path = os.path.join(
+            cache_dir, f"{type(self).__name__}-{self._features_key()}"
+        )
+        if os.path.isdir(cache_path):
+            try:
+                return self._read_features(cache_path)
+            except (OSError, ValueError):
+                pass  # partial or corrupted entry, replace it below
+
+        prices, signal_features = self._process_data()
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=cache_dir, prefix=".tmp-")
+        try:
+            np.save(os.path.join(tmp_path, "prices.npy"), prices)
+            np.save(os.path.join(tmp_path, "signal_features.npy"), signal_features)
+            shutil.rmtree(cache_path, ignore_errors=True)
+            os.rename(tmp_path, cache_path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if not os.path.isdir(cache_path):  # lost a race against another env
+                raise
+        del signal_features  # reopen it as a shared mapping below
+        return self._read_features(cache_path)
+
+    @staticmethod
+    def _read_features(cache_path):
+        prices = np.load(os.path.join(cache_path, "prices.npy"), allow_pickle=False)
+        signal_features = np.load(
+            os.path.join(cache_path, "signal_features.npy"),
+            mmap_mode="r",
+            allow_pickle=False,
+        )
+        return prices, np.asarray(signal_features)
+
+    def _features_params(self):
+        """Parameters of the feature transform, part of the features cache key."""
+        return {}
+
+    def _price_frame(self):
+        """`(frame_bound, window_size)` of the rows of `self.prices`, see `price_array`.
+
+        Tick t is the row `t + frame_bound[0] - window_size` of `df`.
+        """
+        return getattr(self, "frame_bound", None), self.window_size
+
     def _process_data(self):
         raise NotImplementedError
 
     def _calculate_reward(self, action):
         raise NotImplementedError
 
-    def max_possible_profit(self):  # trade fees are ignored
+    def max_possible_profit(self, fee_aware=False):  # fees only if fee_aware
         raise NotImplementedError
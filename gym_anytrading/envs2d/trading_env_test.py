@@ -0,0 +1,89 @@
+"""envs2d TradingEnv Test"""
+
+import os
+
+import numpy as np
+import pytest
+
+from gym_anytrading.datasets import CRYPTO_ETHUSDT_5M
+from gym_anytrading import envs2d
+
+PARAMS = {"threshold": "point", "percentage": 20}
+
+
+def _make_env(df=None, window_size=10, **kwargs):
+    df = CRYPTO_ETHUSDT_5M.iloc[:300] if df is None else df
+    kwargs.setdefault("recurrence_plot_params", PARAMS)
+    return envs2d.CryptoEnv(
+        df.Close,
+        df.High,
+        df.Low,
+        df,
+        window_size=window_size,
+        frame_bound=(window_size, len(df)),
+        **kwargs,
+    )
+
+
+def _entries(cache_dir):
+    return sorted(p for p in os.listdir(cache_dir) if not p.startswith(".tmp-"))
+
+
+def test_features_cache(tmp_path, monkeypatch):
+    expected = _make_env().signal_features
+    env = _make_env(features_cache_dir=tmp_path)
+    np.testing.assert_array_equal(env.signal_features, expected)
+    assert len(_entries(tmp_path)) == 1
+
+    # a second env maps the cached files instead of computing them again
+    def _process_data(self):
+        raise AssertionError("features computed again")
+
+    with monkeypatch.context() as m:
+        m.setattr(envs2d.CryptoEnv, "_process_data", _process_data)
+        cached = _make_env(features_cache_dir=tmp_path)
+    assert isinstance(cached.signal_features.base, np.memmap)
+    assert not cached.signal_features.flags.writeable
+    np.testing.assert_array_equal(cached.signal_features, expected)
+    np.testing.assert_array_equal(cached.prices, env.prices)
+
+
+def test_features_key(tmp_path):
+    df = CRYPTO_ETHUSDT_5M.iloc[:300]
+    changed = df.copy()
+    changed.iloc[-1, changed.columns.get_loc("Volume")] += 1
+
+    # one entry per distinct key
+    for kwargs in [
+        dict(df=df),
+        dict(df=df.copy()),
+        dict(df=df, window_size=12),
+        dict(df=df, recurrence_plot_params={**PARAMS, "percentage": 30}),
+        dict(df=changed),
+        dict(df=df, compact_features=True),
+    ]:
+        _make_env(**kwargs, features_cache_dir=tmp_path)
+    assert len(_entries(tmp_path)) == 5
+
+
+def test_features_cache_recovery(tmp_path):
+    expected = _make_env().signal_features
+
+    # a half-written entry is never a hit
+    tmp_entry = tmp_path / ".tmp-partial"
+    tmp_entry.mkdir()
+    np.save(tmp_entry / "prices.npy", np.zeros(1))
+    np.save(tmp_entry / "signal_features.npy", np.zeros(1))
+    env = _make_env(features_cache_dir=tmp_path)
+    np.testing.assert_array_equal(env.signal_features, expected)
+    (entry,) = _entries(tmp_path)
+    del env
+
+    # a truncated entry is recomputed and replaced
+    path = tmp_path / entry / "signal_features.npy"
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) // 2)
+    env = _make_env(features_cache_dir=tmp_path)
+    np.testing.assert_array_equal(env.signal_features, expected)
+    assert _entries(tmp_path) == [entry]
+    assert os.path.getsize(path) > expected.nbytes
@@ -1,3 +1,4 @@
 from ..typedefs import OrderAction, Position
 from .trading_env import TradingEnv
 from .crypto_env import CryptoEnv
+from .vector_env import CryptoVectorEnv
@@ -24,6 +24,10 @@ class CryptoEnv(TradingEnv):
         render_mode=None,
         reward_type=RewardType.LogReturns,
         box_range: Tuple[float, float] = (-INF, INF),
+        info_keys=None,
+        history_retention="full",
+        mark_to_market=False,
+        observation_mode="window",
     ):
         assert len(frame_bound) == 2
 
@@ -41,18 +45,18 @@ class CryptoEnv(TradingEnv):
             trade_fee_ask_percent=trade_fee,
             trade_fee_bid_percent=trade_fee,
             box_range=box_range,
+            info_keys=info_keys,
+            history_retention=history_retention,
+            mark_to_market=mark_to_market,
+            observation_mode=observation_mode,
         )
 
     def _process_data(self):
-        prices = self.prices.values
-
-        # prices[
-        #     self.frame_bound[0] - self.window_size
-        # ]  # validate index (TODO: Improve validation)
-        # prices = prices[self.frame_bound[0] - self.window_size : self.frame_bound[1]]
+        frame = slice(self.frame_bound[0] - self.window_size, self.frame_bound[1])
+        prices = self.prices.values[frame]
 
         # signal_features = self.signal_features.T
-        signal_features = self.df.values
+        signal_features = self.df.values[frame]
 
         return prices.astype(np.float32), signal_features.astype(np.float32)
 
@@ -64,13 +68,8 @@ class CryptoEnv(TradingEnv):
         if action == 0.0:
             return step_reward
 
-        if self._position < 0.0 and action < 0.0:  # (Position.Short, Action.Sell)
-            # increase short position
-            return step_reward
-        elif self._position > 0.0 and action > 0.0:  # (Position.Long, Action.Buy)
-            # increase long position
-            return step_reward
-
+        # increasing a position is recorded too: it only adds to the entry,
+        # the metrics (and the reward) change when the position is offset
         assert (
             abs(self._position + action) <= 1.0
         ), f"position({self._position}) + action({action}) should be between -1 and 1."
@@ -90,6 +89,9 @@ class CryptoEnv(TradingEnv):
 
         step_reward = updated_reward - current_reward
 
-        self._epoch = self.df.index[self._current_tick]
+        # ticks are relative to the frame, the index is not
+        self._epoch = self.df.index[
+            self._current_tick + self.frame_bound[0] - self.window_size
+        ]
 
         return step_reward
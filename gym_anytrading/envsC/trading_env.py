@@ -8,10 +8,11 @@ import matplotlib.pyplot as plt
 
 import gymnasium as gym
 from ..typedefs import RewardType, Position
-from ..reward import RewardCalculator
-
+from ..reward import RewardCalculator, check_info_keys, check_reward_type
+from ..history import History, check_history_retention
 
 INF = 1e10
+OBSERVATION_MODES = ("window", "copy", "index")
 
 
 class TradingEnv(gym.Env):
@@ -30,13 +31,33 @@ class TradingEnv(gym.Env):
         trade_fee_ask_percent=0.0,
         trade_fee_bid_percent=0.0,
         box_range: Tuple[float, float] = (-INF, INF),
+        info_keys=None,
+        history_retention="full",
+        mark_to_market=False,
+        observation_mode="window",
     ):
         assert df.ndim == 2
         assert render_mode is None or render_mode in self.metadata["render_modes"]
         assert box_range[0] < box_range[1], "box_range should be a tuple (low, high)"
 
         self.render_mode = render_mode
-        self._reward_type = reward_type
+        self._reward_type = check_reward_type(reward_type, mark_to_market)
+        # info keys returned by step/reset: None for all, () for none
+        self._info_keys = check_info_keys(info_keys, mark_to_market)
+        # "off", "summary", last K steps (int) or "full", see `History`
+        self._history_retention = check_history_retention(history_retention)
+        # revalue the open position every tick: dense rewards over whole steps
+        self._mark_to_market = mark_to_market
+        # "window": read-only (window_size, F) views of signal_features,
+        # "copy": the window copied into a buffer owned by the env (writable,
+        # overwritten by the next step), "index": the tick and the position
+        # only, for replay buffers that `gather` windows in batches
+        if observation_mode not in OBSERVATION_MODES:
+            raise ValueError(
+                f"observation_mode must be one of {OBSERVATION_MODES}, "
+                f"got {observation_mode!r}"
+            )
+        self._observation_mode = observation_mode
         self._trade_fee_ask_percent = trade_fee_ask_percent
         self._trade_fee_bid_percent = trade_fee_bid_percent
 
@@ -44,15 +65,27 @@ class TradingEnv(gym.Env):
         self.df = df[df.columns[~df.columns.isin([prices.name, ask.name, bid.name])]]
         self.window_size = window_size
         self.prices, self.signal_features = self._process_data()
+        # observations are zero-copy views, which must not modify the data
+        self.signal_features.flags.writeable = False
         self.shape = (window_size, len(self.df.columns))
+        self._observation = None
+        if observation_mode == "copy":
+            self._observation = np.empty(self.shape, self.signal_features.dtype)
+        # windows[i] is the observation window starting at tick i (a view)
+        self._windows = np.lib.stride_tricks.sliding_window_view(
+            self.signal_features, window_size, axis=0
+        ).transpose(0, 2, 1)
 
         # reward calculator setup
         self._reward_calculator = RewardCalculator(
-            prices=self.prices,
+            prices=prices,
             ask=ask,
             bid=bid,
+            frame_bound=getattr(self, "frame_bound", None),
+            window_size=window_size,
             trade_fee_ask_percent=trade_fee_ask_percent,
             trade_fee_bid_percent=trade_fee_bid_percent,
+            mark_to_market=mark_to_market,
         )
 
         # spaces
@@ -62,12 +95,22 @@ class TradingEnv(gym.Env):
             shape=(1,),
             dtype=np.float32,
         )
-        self.observation_space = gym.spaces.Box(
-            low=-INF,
-            high=INF,
-            shape=self.shape,
-            dtype=np.float32,
-        )
+        if observation_mode == "index":
+            self.observation_space = gym.spaces.Dict(
+                {
+                    "tick": gym.spaces.Discrete(len(self.signal_features)),
+                    "position": gym.spaces.Box(
+                        low=-1, high=1, shape=(1,), dtype=np.float32
+                    ),
+                }
+            )
+        else:
+            self.observation_space = gym.spaces.Box(
+                low=-INF,
+                high=INF,
+                shape=self.shape,
+                dtype=np.float32,
+            )
 
         # episode
         self._start_tick = self.window_size - 1
@@ -77,7 +120,10 @@ class TradingEnv(gym.Env):
         self._last_trade_tick = None
 
         self._position = None
+        # position at each tick, 0 before the episode start
         self._position_history = None
+        if self._history_retention not in ("off", "summary"):
+            self._position_history = np.zeros(self._end_tick + 1, dtype=np.float32)
 
         # self._total_reward = None
         # self._total_profit = None
@@ -99,13 +145,16 @@ class TradingEnv(gym.Env):
         self._current_tick = self._start_tick
         self._last_trade_tick = self._current_tick - 1
         self._position: Position = Position(0.0)
-        self._position_history = (self.window_size * [None]) + [self._position]
+        if self._position_history is not None:
+            self._position_history.fill(0.0)
+            self._position_history[self._current_tick] = self._position
 
         # self._total_reward = 0.0
         # self._total_profit = 1.0  # unit
 
         self._first_rendering = True
-        self.history = {}
+        if self.history is not None:
+            self.history.clear()
 
         observation = self._get_observation()
         info = self._get_info()
@@ -124,7 +173,7 @@ class TradingEnv(gym.Env):
             _type_: _description_
         """
         # action_space is Box(1,) with range (-2, 2). This gonna be a np.array.
-        action = float(action)
+        action = float(np.asarray(action).item())
 
         self._truncated = False
         self._current_tick += 1
@@ -138,19 +187,31 @@ class TradingEnv(gym.Env):
         elif self._position + action < -1:
             action = -1 - self._position
 
+        if self._mark_to_market:
+            start_reward = self._reward_calculator.reward(self._reward_type)
+
         step_reward = self._calculate_reward(action)
 
         _next_position = self._position + action
+        if np.sign(self._position) != np.sign(_next_position):
+            # opened from flat, closed or reversed
+            self._last_trade_tick = self._current_tick
+
         if action != 0.0:
             self._position = _next_position
 
-        if np.sign(self._position) * np.sign(_next_position) < 0:
-            self._last_trade_tick = self._current_tick
+        if self._mark_to_market:
+            self._reward_calculator.mark_to_market(self._current_tick)
+            step_reward = (
+                self._reward_calculator.reward(self._reward_type) - start_reward
+            )
 
-        self._position_history.append(self._position)
+        if self._position_history is not None:
+            self._position_history[self._current_tick] = self._position
         observation = self._get_observation()
         info = self._get_info()
-        self._update_history(info)
+        if self._history_retention != "off":
+            self._update_history(info)
 
         if self.render_mode == "human":
             self._render_frame()
@@ -158,19 +219,38 @@ class TradingEnv(gym.Env):
         return observation, step_reward, False, self._truncated, info
 
     def _get_info(self):
-        return self._reward_calculator.get_info()
+        return self._reward_calculator.get_info(self._info_keys)
 
     def _get_observation(self):
-        return self.signal_features[
+        if self._observation_mode == "index":
+            return {
+                "tick": np.int64(self._current_tick),
+                "position": np.array([self._position], dtype=np.float32),
+            }
+        window = self.signal_features[
             (self._current_tick - self.window_size + 1) : self._current_tick + 1
         ]
+        if self._observation is not None:
+            self._observation[:] = window
+            return self._observation
+        return window
+
+    def gather(self, ticks):
+        """Observation windows ending at `ticks` (e.g. the "tick" of a batch
+        of "index" observations), `ticks.shape + (window_size, F)`."""
+        ticks = np.asarray(ticks, dtype=np.int64)
+        first, last = self.window_size - 1, len(self.signal_features) - 1
+        if ticks.size and (ticks.min() < first or ticks.max() > last):
+            raise IndexError(f"ticks must be in [{first}, {last}]")
+        return self._windows[ticks - first]
 
     def _update_history(self, info):
-        if not self.history:
-            self.history = {key: [] for key in info.keys()}
+        if self.history is None:
+            self.history = History.for_retention(
+                self._history_retention, info, self._end_tick - self._start_tick
+            )
 
-        for key, value in info.items():
-            self.history[key].append(value)
+        self.history.append(info)
 
     def _render_frame(self):
         self.render()
@@ -179,9 +259,9 @@ class TradingEnv(gym.Env):
 
         def _plot_position(position, tick):
             color = None
-            if position == self.PositionsN.is_short():
+            if position < 0:
                 color = "red"
-            elif position == self.PositionsN.is_long():
+            elif position > 0:
                 color = "green"
             if color:
                 plt.scatter(tick, self.prices[tick], color=color)
@@ -192,15 +272,16 @@ class TradingEnv(gym.Env):
             self._first_rendering = False
             plt.cla()
             plt.plot(self.prices)
-            start_position = self._position_history[self._start_tick]
-            _plot_position(start_position, self._start_tick)
+            if self._position_history is not None:
+                start_position = self._position_history[self._start_tick]
+                _plot_position(start_position, self._start_tick)
 
         _plot_position(self._position, self._current_tick)
 
         plt.suptitle(
-            "Total Reward: %.6f" % self._total_reward
+            "Total Reward: %.6f" % self._reward_calculator.reward(self._reward_type)
             + " ~ "
-            + "Total Profit: %.6f" % self._total_profit
+            + "Total Profit: %.6f" % self._reward_calculator.reward(RewardType.Profit)
         )
 
         end_time = time()
@@ -212,27 +293,22 @@ class TradingEnv(gym.Env):
         plt.pause(pause_time)
 
     def render_all(self, title=None):
-        window_ticks = np.arange(len(self._position_history))
         plt.plot(self.prices)
 
-        short_ticks = []
-        long_ticks = []
-        for i, tick in enumerate(window_ticks):
-            if self._position_history[i] == self.PositionsN.is_short():
-                short_ticks.append(tick)
-            elif self._position_history[i] == self.Positions.is_long():
-                long_ticks.append(tick)
-
-        plt.plot(short_ticks, self.prices[short_ticks], "ro")
-        plt.plot(long_ticks, self.prices[long_ticks], "go")
+        # positions are not recorded with history_retention "off"/"summary"
+        if self._position_history is not None:
+            short_ticks = np.flatnonzero(self._position_history < 0)
+            long_ticks = np.flatnonzero(self._position_history > 0)
+            plt.plot(short_ticks, self.prices[short_ticks], "ro")
+            plt.plot(long_ticks, self.prices[long_ticks], "go")
 
         if title:
             plt.title(title)
 
         plt.suptitle(
-            "Total Reward: %.6f" % self._total_reward
+            "Total Reward: %.6f" % self._reward_calculator.reward(self._reward_type)
             + " ~ "
-            + "Total Profit: %.6f" % self._total_profit
+            + "Total Profit: %.6f" % self._reward_calculator.reward(RewardType.Profit)
         )
 
     def close(self):
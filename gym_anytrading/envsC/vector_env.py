@@ -0,0 +1,175 @@
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from gymnasium.vector import AutoresetMode, VectorEnv
+from gymnasium.vector.utils import batch_space
+
+from .crypto_env import CryptoEnv
+from ..typedefs import RewardType
+from ..reward import VectorRewardCalculator, check_reward_type
+
+INF = 1e10
+
+
+class CryptoVectorEnv(VectorEnv):
+    """`num_envs` copies of the continuous-position `CryptoEnv` stepped with
+    array operations.
+
+    Positions in [-1, 1], ticks and last trade ticks are `(num_envs,)` arrays.
+    Actions are clipped, offset against the open entry and turned into
+    rewards for all sub-envs at once. Rewards and infos match stepping the
+    scalar envs one by one. Sub-envs are reset on the step after they are
+    truncated (next-step autoreset).
+    """
+
+    metadata = {"autoreset_mode": AutoresetMode.NEXT_STEP}
+
+    def __init__(
+        self,
+        num_envs: int,
+        prices: pd.Series,
+        ask: pd.Series,
+        bid: pd.Series,
+        df: pd.DataFrame,
+        window_size: int,
+        frame_bound,
+        trade_fee=0.0003,
+        leverage: float = 1.0,
+        reward_type=RewardType.LogReturns,
+        box_range: Tuple[float, float] = (-INF, INF),
+        info_keys=None,
+    ):
+        check_reward_type(reward_type)  # no mark-to-market mode
+        # a single scalar env holds the data and spaces shared by every sub-env
+        env = CryptoEnv(
+            prices,
+            ask,
+            bid,
+            df,
+            window_size,
+            frame_bound,
+            trade_fee=trade_fee,
+            leverage=leverage,
+            reward_type=reward_type,
+            box_range=box_range,
+            info_keys=info_keys,
+            history_retention="off",
+        )
+
+        self.num_envs = num_envs
+        self.window_size = window_size
+        self.prices = env.prices
+        self.signal_features = env.signal_features
+        self._reward_type = reward_type
+        self._info_keys = env._info_keys
+        # the frame-aligned prices of the scalar env, whose calculator never
+        # builds its drawdown tables
+        self._reward_calculator = VectorRewardCalculator(
+            num_envs,
+            trade_fee_ask_percent=trade_fee,
+            trade_fee_bid_percent=trade_fee,
+            ask=env._reward_calculator._ask,
+            bid=env._reward_calculator._bid,
+        )
+
+        # spaces
+        self.single_action_space = env.action_space
+        self.single_observation_space = env.observation_space
+        self.action_space = batch_space(self.single_action_space, num_envs)
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+
+        # episode
+        self._start_tick = env._start_tick
+        self._end_tick = env._end_tick
+        self._window_offsets = np.arange(-self.window_size + 1, 1)
+        self._current_tick = np.zeros(num_envs, dtype=np.int64)
+        self._last_trade_tick = np.zeros(num_envs, dtype=np.int64)
+        self._position = np.zeros(num_envs)
+        self._autoreset = np.zeros(num_envs, dtype=bool)
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed, options=options)
+        if seed is not None:
+            self.action_space.seed(seed)
+
+        self._reset_envs(slice(None))
+
+        return self._get_observation(), self._get_info()
+
+    def step(self, actions):
+        # action_space is Box(num_envs, 1) with range (-2, 2).
+        actions = np.asarray(actions, dtype=np.float64).reshape(self.num_envs)
+        active = ~self._autoreset
+
+        self._current_tick[active] += 1
+        truncated = active & (self._current_tick == self._end_tick)
+
+        # Ensure actions are within the proper range
+        actions = np.where(
+            self._position + actions > 1,
+            1 - self._position,
+            np.where(self._position + actions < -1, -1 - self._position, actions),
+        )
+        actions[~active] = 0.0
+
+        rewards = self._calculate_reward(actions)
+
+        next_position = self._position + actions
+        # opened from flat, closed or reversed
+        trade = np.sign(self._position) != np.sign(next_position)
+        self._last_trade_tick[trade] = self._current_tick[trade]
+        self._position = next_position
+
+        # next-step autoreset of the sub-envs truncated at the previous step
+        self._reset_envs(self._autoreset)
+        self._autoreset = truncated
+
+        observation = self._get_observation()
+        info = self._get_info()
+
+        return (
+            observation,
+            rewards,
+            np.zeros(self.num_envs, dtype=bool),
+            truncated,
+            info,
+        )
+
+    def _reset_envs(self, envs):
+        self._reward_calculator.reset(envs)
+        self._current_tick[envs] = self._start_tick
+        self._last_trade_tick[envs] = self._start_tick - 1
+        self._position[envs] = 0.0
+
+    def _calculate_reward(self, actions):
+        rewards = np.zeros(self.num_envs)
+
+        # increasing a position only adds to the entry, holding is a no-op
+        envs = np.flatnonzero(actions != 0.0)
+        if len(envs) == 0:
+            return rewards
+
+        current_reward = self._reward_calculator.reward(self._reward_type)[envs]
+
+        # calculate metrics
+        self._reward_calculator.update(
+            envs,
+            self._position[envs],
+            actions[envs],
+            self._current_tick[envs],
+            self._last_trade_tick[envs],
+        )
+
+        # calculate reward
+        updated_reward = self._reward_calculator.reward(self._reward_type)[envs]
+        rewards[envs] = updated_reward - current_reward
+
+        return rewards
+
+    def _get_info(self):
+        return self._reward_calculator.get_info(self._info_keys)
+
+    def _get_observation(self):
+        return self.signal_features[self._current_tick[:, None] + self._window_offsets]
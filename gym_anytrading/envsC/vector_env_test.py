@@ -0,0 +1,73 @@
+"""CryptoVectorEnv Test"""
+
+import numpy as np
+import pytest
+
+from gym_anytrading.datasets import CRYPTO_ETHUSDT_5M
+from gym_anytrading.envsC import CryptoEnv, CryptoVectorEnv
+from gym_anytrading.typedefs import RewardType
+
+
+def test_crypto_vector_env_matches_scalar_envs():
+    df = CRYPTO_ETHUSDT_5M.iloc[:200]
+    kwargs = dict(
+        prices=df.Close,
+        ask=df.High,
+        bid=df.Low,
+        df=df,
+        window_size=10,
+        frame_bound=(10, len(df)),
+        reward_type=RewardType.SQN,
+    )
+    num_envs = 4
+
+    vector_env = CryptoVectorEnv(num_envs, **kwargs)
+    envs = [CryptoEnv(**kwargs) for _ in range(num_envs)]
+
+    observations, _ = vector_env.reset(seed=0)
+    for i, env in enumerate(envs):
+        observation, _ = env.reset(seed=0)
+        np.testing.assert_array_equal(observations[i], observation)
+
+    # two and a half episodes, so that every sub-env is autoreset twice
+    rng = np.random.default_rng(0)
+    autoreset = np.zeros(num_envs, dtype=bool)
+    for _ in range(2 * (len(df) - kwargs["window_size"]) + 50):
+        actions = rng.choice(
+            [-2.0, -1.0, -0.5, -0.25, 0.0, 0.25, 0.5, 1.0, 2.0], num_envs
+        )
+        actions = actions.astype(np.float32)[:, None]
+        observations, rewards, _, truncated, infos = vector_env.step(actions)
+
+        for i, env in enumerate(envs):
+            if autoreset[i]:
+                observation, info = env.reset()
+                reward, done = 0.0, False
+            else:
+                observation, reward, _, done, info = env.step(actions[i])
+
+            np.testing.assert_array_equal(observations[i], observation)
+            assert rewards[i] == reward or np.isnan(rewards[i]) and np.isnan(reward)
+            assert truncated[i] == done
+            for key, value in info.items():
+                np.testing.assert_equal(infos[key][i], value, err_msg=key)
+        autoreset = truncated
+
+
+@pytest.mark.parametrize(
+    "reward_type",
+    [
+        RewardType.EquityLogReturns,
+        RewardType.Drawdown,
+        RewardType.EquityMaxDD,
+        RewardType.DDPenalizedLogReturns,
+    ],
+)
+def test_crypto_vector_env_rejects_mark_to_market_rewards(reward_type):
+    df = CRYPTO_ETHUSDT_5M.iloc[:200]
+    kwargs = dict(window_size=10, frame_bound=(10, len(df)), reward_type=reward_type)
+    with pytest.raises(ValueError, match=reward_type.name):
+        CryptoVectorEnv(2, df.Close, df.High, df.Low, df, **kwargs)
+    with pytest.raises(ValueError, match=reward_type.name):
+        CryptoEnv(df.Close, df.High, df.Low, df, **kwargs)
+    CryptoEnv(df.Close, df.High, df.Low, df, **kwargs, mark_to_market=True)
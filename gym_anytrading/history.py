@@ -0,0 +1,111 @@
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+HISTORY_RETENTIONS = ("off", "summary", "full")
+
+
+def check_history_retention(retention):
+    """Validate the `history_retention` option of the envs.
+
+    "off" records nothing, "summary" keeps the info of the last step only
+    (the metrics are cumulative, so it summarizes the episode so far), an int
+    K keeps the last K steps and "full" keeps every step of the episode.
+    """
+    if isinstance(retention, str) and retention in HISTORY_RETENTIONS:
+        return retention
+    if isinstance(retention, (int, np.integer)) and not isinstance(retention, bool):
+        if retention > 0:
+            return int(retention)
+    raise ValueError(
+        f"history_retention must be one of {HISTORY_RETENTIONS} or a positive "
+        f"int, got {retention!r}"
+    )
+
+
+class History(Mapping):
+    """Step infos of an episode, kept in preallocated float64 columns.
+
+    Rows are written in place, so nothing is allocated while stepping, and
+    `clear()` rewinds the buffer for the next episode. With `rolling=True`
+    only the last `capacity` steps are kept. `history[key]`, `to_numpy()` and
+    `to_dataframe()` are zero-copy views of the retained rows, oldest first:
+    copy them to keep them past the next step or reset.
+    """
+
+    def __init__(self, keys, capacity, rolling=False):
+        self._keys = tuple(keys)
+        self._columns = {key: i for i, key in enumerate(self._keys)}
+        self._capacity = capacity
+        self._rolling = rolling
+        # column-major, so every column is a contiguous array. A rolling
+        # buffer writes each row twice, `capacity` rows apart, so that the
+        # last `capacity` rows are always one contiguous slice.
+        self._data = np.empty(
+            ((2 if rolling else 1) * capacity, len(self._keys)), order="F"
+        )
+        self._size = 0
+
+    @classmethod
+    def for_retention(cls, retention, keys, num_steps):
+        """History of an episode of `num_steps` steps, see
+        `check_history_retention`."""
+        if retention == "full":
+            return cls(keys, num_steps)
+        if retention == "summary":
+            return cls(keys, 1, rolling=True)
+        return cls(keys, min(retention, num_steps), rolling=True)
+
+    def __getitem__(self, key):
+        return self.to_numpy()[:, self._columns[key]]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    @property
+    def num_steps(self):
+        """Number of steps appended since the last reset, retained or not."""
+        return self._size
+
+    def append(self, info):
+        row = [info[key] for key in self._keys]
+        if self._rolling:
+            i = self._size % self._capacity
+            self._data[i] = self._data[i + self._capacity] = row
+        else:
+            self._data[self._size] = row
+        self._size += 1
+
+    def extend(self, rows):
+        """Append a `(steps, len(keys))` array of rows at once."""
+        rows = np.asarray(rows, dtype=np.float64)
+        if self._rolling:
+            # only the last `capacity` rows are retained
+            kept = rows[-self._capacity :]
+            i = (self._size + len(rows) - len(kept) + np.arange(len(kept))) % (
+                self._capacity
+            )
+            self._data[i] = self._data[i + self._capacity] = kept
+        else:
+            self._data[self._size : self._size + len(rows)] = rows
+        self._size += len(rows)
+
+    def clear(self):
+        self._size = 0
+
+    def to_numpy(self):
+        """`(retained steps, len(keys))` view of the retained rows."""
+        if self._size <= self._capacity:
+            return self._data[: self._size]
+        start = self._size % self._capacity
+        return self._data[start : start + self._capacity]
+
+    def to_dataframe(self, index=None):
+        """DataFrame view of the retained rows, one column per info key."""
+        return pd.DataFrame(
+            self.to_numpy(), index=index, columns=self._keys, copy=False
+        )
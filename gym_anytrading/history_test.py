@@ -0,0 +1,90 @@
+"""History Test"""
+
+import numpy as np
+import pytest
+
+from gym_anytrading.datasets import CRYPTO_ETHUSDT_5M
+from gym_anytrading.envsC import CryptoEnv
+from gym_anytrading.history import History, check_history_retention
+
+
+def test_history_columns():
+    df = CRYPTO_ETHUSDT_5M.iloc[:100]
+    env = CryptoEnv(
+        df.Close,
+        df.High,
+        df.Low,
+        df,
+        window_size=10,
+        frame_bound=(10, len(df)),
+        info_keys=["Trades", "Profit"],
+    )
+
+    rng = np.random.default_rng(0)
+    for _ in range(2):
+        env.reset(seed=0)
+        infos = []
+        truncated = False
+        while not truncated:
+            action = rng.choice([-1.0, -0.5, 0.0, 0.5, 1.0], size=(1,))
+            _, _, _, truncated, info = env.step(action)
+            infos.append(info)
+
+        history = env.history
+        assert [*history] == ["Trades", "Profit"]
+        assert history.num_steps == len(infos) == env._end_tick - env._start_tick
+        for key in history:
+            np.testing.assert_array_equal(history[key], [i[key] for i in infos])
+
+        df_history = history.to_dataframe()
+        assert np.shares_memory(df_history.to_numpy(), history.to_numpy())
+
+        positions = env._position_history
+        assert positions.dtype == np.float32
+        assert (positions[: env._start_tick] == 0.0).all()
+        assert positions[env._end_tick] == np.float32(env._position)
+
+
+def test_history_rolling():
+    history = History(["a", "b"], 3, rolling=True)
+    for i in range(7):
+        history.append({"a": i, "b": -i})
+        rows = np.arange(max(i - 2, 0), i + 1)
+        np.testing.assert_array_equal(history["a"], rows)
+        np.testing.assert_array_equal(history.to_numpy(), np.c_[rows, -rows])
+    assert history.num_steps == 7
+
+    history.clear()
+    assert history.to_dataframe().empty
+
+
+@pytest.mark.parametrize("retention", ["off", "summary", 5, "full"])
+def test_history_retention(retention):
+    df = CRYPTO_ETHUSDT_5M.iloc[:50]
+    env = CryptoEnv(
+        df.Close,
+        df.High,
+        df.Low,
+        df,
+        window_size=10,
+        frame_bound=(10, len(df)),
+        history_retention=retention,
+    )
+    env.reset(seed=0)
+    truncated = False
+    while not truncated:
+        _, _, _, truncated, info = env.step(np.array([0.5 - env._position]))
+
+    num_steps = env._end_tick - env._start_tick
+    if retention == "off":
+        assert env.history is None
+    else:
+        expected = {"summary": 1, "full": num_steps}.get(retention, retention)
+        assert env.history.num_steps == num_steps
+        assert len(env.history["Trades"]) == expected
+        assert env.history["Trades"][-1] == info["Trades"]
+    assert (env._position_history is None) == (retention in ("off", "summary"))
+    env.render_all()
+
+    with pytest.raises(ValueError):
+        check_history_retention(0)
@@ -0,0 +1,126 @@
+import os
+import json
+import shutil
+import tempfile
+
+import numpy as np
+
+from .replay import replay
+
+_DATASET_VERSION = 1
+
+
+def export_dataset(path, env, episodes):
+    """Write D4RL-style transitions of the discrete `CryptoEnv` `env` to the
+    directory `path`, one `episodes` entry (an array of actions) per episode.
+
+    `signal_features` is written once and every observation is stored as the
+    tick its window ends at, so the dataset grows with the number of steps,
+    not with `window_size`. Rewards are those of `env.replay`. Every array is
+    an `.npy` file filled through a memory map, episode by episode, and the
+    directory only appears once complete. Read it back with
+    `TransitionDataset(path)`.
+    """
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    num_steps = env._end_tick - env._start_tick
+    size = len(episodes) * num_steps
+
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    try:
+        np.save(
+            os.path.join(tmp_path, "signal_features.npy"),
+            np.ascontiguousarray(env.signal_features),
+        )
+        columns = {
+            name: np.lib.format.open_memmap(
+                os.path.join(tmp_path, f"{name}.npy"),
+                mode="w+",
+                dtype=dtype,
+                shape=(size,),
+            )
+            for name, dtype in [
+                ("observations", np.int64),
+                ("next_observations", np.int64),
+                ("actions", np.int8),
+                ("rewards", np.float64),
+                ("terminals", bool),
+                ("timeouts", bool),
+            ]
+        }
+        for i, actions in enumerate(episodes):
+            episode = replay(env, actions)
+            rows = slice(i * num_steps, (i + 1) * num_steps)
+            columns["observations"][rows] = episode.ticks - 1
+            columns["next_observations"][rows] = episode.ticks
+            columns["actions"][rows] = actions
+            columns["rewards"][rows] = episode.rewards
+            columns["terminals"][rows] = False
+            columns["timeouts"][rows] = False
+            columns["timeouts"][rows.stop - 1] = True
+        for column in columns.values():
+            column.flush()
+        del columns
+
+        meta = {
+            "version": _DATASET_VERSION,
+            "env": type(env).__name__,
+            "reward_type": env._reward_type.name,
+            "window_size": env.window_size,
+            "num_episodes": len(episodes),
+        }
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        os.rename(tmp_path, path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+
+class TransitionDataset:
+    """Transitions written by `export_dataset`, memory-mapped read-only.
+
+    `observations` and `next_observations` hold ticks; `dataset[index]`
+    returns the transitions at `index` (an int, slice or array) with their
+    `(window_size, F)` windows of `signal_features` built on demand.
+    """
+
+    _KEYS = (
+        "observations",
+        "next_observations",
+        "actions",
+        "rewards",
+        "terminals",
+        "timeouts",
+    )
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != _DATASET_VERSION:
+            raise ValueError(f"Unsupported dataset version {self.meta['version']}")
+
+        def load(name):
+            return np.load(
+                os.path.join(path, f"{name}.npy"), mmap_mode="r", allow_pickle=False
+            )
+
+        self.window_size = self.meta["window_size"]
+        self.signal_features = load("signal_features")
+        self.columns = {key: load(key) for key in self._KEYS}
+        self._window_offsets = np.arange(-self.window_size + 1, 1)
+
+    def __len__(self):
+        return len(self.columns["rewards"])
+
+    def __getitem__(self, index):
+        transitions = {key: column[index] for key, column in self.columns.items()}
+        for key in ("observations", "next_observations"):
+            transitions[key] = self.windows(transitions[key])
+        return transitions
+
+    def windows(self, ticks):
+        """Observation windows ending at `ticks`, `ticks.shape + (window_size, F)`."""
+        return self.signal_features[np.add.outer(ticks, self._window_offsets)]
@@ -0,0 +1,46 @@
+"""Offline Dataset Test"""
+
+import numpy as np
+import pytest
+
+from gym_anytrading.datasets import CRYPTO_ETHUSDT_5M
+from gym_anytrading.envs import CryptoEnv
+from gym_anytrading.offline import TransitionDataset, export_dataset
+
+
+def test_export_dataset(tmp_path):
+    df = CRYPTO_ETHUSDT_5M.iloc[:100]
+    env = CryptoEnv(df.Close, df.High, df.Low, df, 10, (10, len(df)))
+    num_steps = env._end_tick - env._start_tick
+    rng = np.random.default_rng(0)
+    episodes = rng.integers(0, 2, (3, num_steps))
+
+    path = tmp_path / "dataset"
+    export_dataset(path, env, episodes)
+    with pytest.raises(FileExistsError):
+        export_dataset(path, env, episodes)
+
+    dataset = TransitionDataset(path)
+    assert len(dataset) == 3 * num_steps
+    assert isinstance(dataset.columns["rewards"], np.memmap)
+    assert dataset.signal_features.shape == env.signal_features.shape
+
+    # every episode matches stepping the env
+    for i, actions in enumerate(episodes):
+        transitions = dataset[i * num_steps : (i + 1) * num_steps]
+        observation, _ = env.reset(seed=0)
+        for j, action in enumerate(actions):
+            next_observation, reward, terminated, truncated, _ = env.step(action)
+            np.testing.assert_array_equal(transitions["observations"][j], observation)
+            np.testing.assert_array_equal(
+                transitions["next_observations"][j], next_observation
+            )
+            assert transitions["actions"][j] == action
+            assert transitions["rewards"][j] == reward
+            assert transitions["terminals"][j] == terminated
+            assert transitions["timeouts"][j] == truncated
+            observation = next_observation
+
+    # windows are only built for the requested transitions
+    batch = dataset[np.array([5, 0, 7])]
+    assert batch["observations"].shape == (3, 10, env.shape[1])
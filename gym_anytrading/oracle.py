@@ -0,0 +1,129 @@
+import numpy as np
+
+from .typedefs import Actions
+
+
+def monotone_runs(prices, start_tick, end_tick):
+    """Runs of falling and of rising (or flat) prices over the ticks
+    `start_tick..end_tick`, as walked by `max_possible_profit`.
+
+    Returns `(entry_ticks, exit_ticks, rising)` arrays, one entry per run:
+    a run is traded from the tick before it to its last tick.
+    """
+    prices = np.asarray(prices)
+    ticks = np.arange(start_tick, end_tick + 1)
+    if len(ticks) == 0:
+        return ticks, ticks, np.zeros(0, dtype=bool)
+    rising = ~(prices[ticks] < prices[ticks - 1])
+    last = np.append(np.flatnonzero(rising[1:] != rising[:-1]), len(ticks) - 1)
+    exit_ticks = ticks[last]
+    entry_ticks = np.concatenate(([start_tick - 1], exit_ticks[:-1]))
+    return entry_ticks, exit_ticks, rising[last]
+
+
+def best_round_trips(enter, exit):
+    """Best total log growth of non-overlapping round trips, starting and
+    ending flat.
+
+    `enter[i]` and `exit[i]` are the log growth of opening and of closing a
+    position at pivot i, a trade fee included, e.g. `log1p(-fee) - log(price)`
+    and `log(price)` for a long position. Trades that do not pay for their
+    fees are skipped or merged with the next ones.
+    """
+    return _forward_values(enter, exit)[-1, 0]
+
+
+def oracle_positions(ask, bid, trade_fee_ask_percent=0.0, trade_fee_bid_percent=0.0):
+    """Best long (+1) / short (-1) position at every tick, with hindsight.
+
+    The position starts short at tick 0 and may be reversed at any later
+    tick, buying at `ask` or selling at `bid` (bid <= ask) and paying the fee
+    of the order, so that moves smaller than the spread and fees are not
+    traded.
+    Returns the `(len(ask),)` int8 positions and their total log growth
+    (the open position valued at the last tick).
+    """
+    log_ask = np.log(np.asarray(ask, dtype=np.float64))
+    log_bid = np.log(np.asarray(bid, dtype=np.float64))
+    n = len(log_ask)
+    if n == 0:
+        return np.zeros(0, dtype=np.int8), 0.0
+
+    # with bid <= ask, reversing is only worth it at the end of a monotone
+    # run of the ask (buying) or of the bid (selling): buying at a lower ask
+    # or selling at a higher bid is never worse. Tick 1 is the first tick a
+    # trade can be moved to. The position is held between these pivots.
+    pivots = np.union1d(
+        np.arange(min(n, 2)),
+        np.union1d(
+            monotone_runs(log_ask, 1, n - 1)[1], monotone_runs(log_bid, 1, n - 1)[1]
+        ),
+    )
+    log_ask, log_bid = log_ask[pivots], log_bid[pivots]
+
+    # transitions[t][to, from] of the states (short, long): reversing closes
+    # one position and opens the other at the same price
+    transitions = np.zeros((len(pivots) - 1, 2, 2))
+    transitions[:, 1, 0] = np.log1p(-trade_fee_ask_percent) - 2 * log_ask[1:]
+    transitions[:, 0, 1] = np.log1p(-trade_fee_bid_percent) + 2 * log_bid[1:]
+
+    # best log growth reaching each state (forward) and from each state to
+    # the end (backward): the best positions maximize their sum
+    start = np.array([log_bid[0], -np.inf])
+    end = np.array([-log_ask[-1], log_bid[-1]])
+    forward = np.vstack((start, np.max(_max_plus_scan(transitions) + start, axis=2)))
+    reverse = _max_plus_scan(transitions[::-1].transpose(0, 2, 1))
+    backward = np.vstack((np.max(reverse + end, axis=2)[::-1], end))
+    values = forward + backward
+
+    positions = np.where(values[:, 1] > values[:, 0], 1, -1).astype(np.int8)
+    positions = np.repeat(positions, np.diff(pivots, append=n))
+    return positions, float(values[-1].max())
+
+
+def oracle_actions(env):
+    """Actions of `oracle_positions` for an episode of the discrete
+    `CryptoEnv` `env`, one per step, and the positions they lead to.
+
+    The ask and bid prices and fees of the env are used, so that
+    `env.replay(actions)` (or stepping the env) trades the oracle.
+    """
+    calculator = env._reward_calculator
+    ticks = slice(env._start_tick, env._end_tick + 1)
+    positions, _ = oracle_positions(
+        calculator._ask[ticks],
+        calculator._bid[ticks],
+        calculator._trade_fee_ask_percent,
+        calculator._trade_fee_bid_percent,
+    )
+    positions = positions[1:]
+    actions = np.where(positions > 0, Actions.Buy.value, Actions.Sell.value)
+    return actions, positions
+
+
+def _forward_values(enter, exit):
+    # best log growth being flat (column 0) or holding (column 1) after each
+    # pivot, starting flat with log growth 0:
+    #   [flat, holding] <- [max(flat, holding + exit), max(flat + enter, holding)]
+    transitions = np.zeros((len(enter), 2, 2))
+    transitions[:, 0, 1] = exit
+    transitions[:, 1, 0] = enter
+    values = _max_plus_scan(transitions)[:, :, 0]
+    return np.concatenate(([[0.0, -np.inf]], values))
+
+
+def _max_plus_scan(transitions):
+    # prefix max-plus products transitions[t] @ ... @ transitions[0] of
+    # `(n, 2, 2)` matrices in log2(n) passes (Hillis-Steele scan), entry by
+    # entry on contiguous `(n,)` rows
+    m = np.ascontiguousarray(transitions.transpose(1, 2, 0))
+    n = m.shape[2]
+    step = 1
+    while step < n:
+        x, y = m[:, :, step:], m[:, :, :-step]
+        m[:, :, step:] = [
+            [np.maximum(x[i, 0] + y[0, j], x[i, 1] + y[1, j]) for j in range(2)]
+            for i in range(2)
+        ]
+        step *= 2
+    return m.transpose(2, 0, 1)
@@ -0,0 +1,136 @@
+"""Oracle Test"""
+
+import numpy as np
+import pytest
+
+from gym_anytrading.datasets import (
+    CRYPTO_ETHUSDT_5M,
+    FOREX_EURUSD_1H_ASK,
+    STOCKS_GOOGL,
+)
+from gym_anytrading.envs import CryptoEnv, ForexEnv, StocksEnv
+from gym_anytrading.oracle import best_round_trips, oracle_positions
+
+
+def _max_possible_profit_loop(env, side):
+    # the former nested while loops of StocksEnv/ForexEnv.max_possible_profit,
+    # verbatim: products of the float32 prices, within rtol=1e-4 of the oracle
+    prices, fee = env.prices, getattr(env, "trade_fee", None)
+    current_tick = env._start_tick
+    last_trade_tick = current_tick - 1
+    profit = 1.0
+    while current_tick <= env._end_tick:
+        rising = not prices[current_tick] < prices[current_tick - 1]
+        while current_tick <= env._end_tick and rising == (
+            not prices[current_tick] < prices[current_tick - 1]
+        ):
+            current_tick += 1
+        current_price = prices[current_tick - 1]
+        last_trade_price = prices[last_trade_tick]
+        if side == "long" and rising:
+            profit = profit / last_trade_price * current_price
+        elif side == "left" and not rising:
+            profit = profit * (last_trade_price - fee) / current_price
+        elif side == "right" and rising:
+            profit = profit / last_trade_price * (current_price - fee)
+        last_trade_tick = current_tick - 1
+    return profit
+
+
+def _best_round_trips_loop(enter, exit):
+    flat, holding = 0.0, -np.inf
+    for a, b in zip(enter, exit):
+        flat, holding = max(flat, holding + b), max(flat + a, holding)
+    return flat
+
+
+@pytest.mark.parametrize("end", [31, 32, 200, len(STOCKS_GOOGL)])
+def test_stocks_max_possible_profit(end):
+    df = STOCKS_GOOGL.iloc[:end]
+    env = StocksEnv(df.Close, df.Close, df.Close, df, 30, (30, len(df)))
+
+    expected = _max_possible_profit_loop(env, "long")
+    np.testing.assert_allclose(env.max_possible_profit(), expected, rtol=1e-4)
+
+    # trading at the run ends only is as good as at any tick
+    prices = env.prices[env._start_tick - 1 : env._end_tick + 1]
+    log_prices = np.log(prices.astype(np.float64))
+    expected = _best_round_trips_loop(
+        np.log1p(-env._trade_fee_ask_percent) - log_prices,
+        np.log1p(-env._trade_fee_bid_percent) + log_prices,
+    )
+    fee_aware = env.max_possible_profit(fee_aware=True)
+    np.testing.assert_allclose(fee_aware, np.exp(expected), rtol=1e-6)
+    assert 1.0 <= fee_aware <= env.max_possible_profit()
+    env._trade_fee_ask_percent = env._trade_fee_bid_percent = 0.0
+    np.testing.assert_allclose(
+        env.max_possible_profit(fee_aware=True), env.max_possible_profit()
+    )
+
+
+@pytest.mark.parametrize("unit_side", ["left", "right"])
+def test_forex_max_possible_profit(unit_side):
+    env = ForexEnv(FOREX_EURUSD_1H_ASK, 24, (24, 2000), unit_side=unit_side)
+
+    expected = _max_possible_profit_loop(env, unit_side)
+    np.testing.assert_allclose(env.max_possible_profit(), expected, rtol=1e-4)
+    assert env.max_possible_profit(fee_aware=True) >= max(expected, 1.0)
+
+
+def test_best_round_trips():
+    rng = np.random.default_rng(0)
+    for n in [0, 1, 2, 7, 100]:
+        log_prices = np.cumsum(rng.normal(0, 0.01, n))
+        enter, exit = np.log1p(-0.003) - log_prices, log_prices + np.log1p(-0.003)
+        np.testing.assert_allclose(
+            best_round_trips(enter, exit), _best_round_trips_loop(enter, exit)
+        )
+
+
+def _oracle_positions_loop(ask, bid, fee_ask, fee_bid):
+    # Viterbi over the (short, long) states with backtracking
+    log_ask, log_bid = np.log(ask), np.log(bid)
+    values = [log_bid[0], -np.inf]
+    came_from = []
+    for a, b in zip(log_ask[1:], log_bid[1:]):
+        buy = values[0] + np.log1p(-fee_ask) - 2 * a
+        sell = values[1] + np.log1p(-fee_bid) + 2 * b
+        came_from.append((sell > values[0], buy > values[1]))
+        values = [max(values[0], sell), max(values[1], buy)]
+    state = int(values[1] + log_bid[-1] > values[0] - log_ask[-1])
+    total = max(values[0] - log_ask[-1], values[1] + log_bid[-1])
+    positions = [state]
+    for switched in reversed(came_from):
+        state = 1 - state if switched[state] else state
+        positions.append(state)
+    return 2 * np.array(positions[::-1]) - 1, total
+
+
+@pytest.mark.parametrize("fee", [0.0, 0.001, 0.01])
+def test_oracle_positions(fee):
+    rng = np.random.default_rng(1)
+    for n in [1, 2, 10, 500]:
+        bid = 100 * np.exp(np.cumsum(rng.normal(0, 0.005, n)))
+        ask = bid * 1.0005
+        positions, log_growth = oracle_positions(ask, bid, fee, fee)
+        expected, expected_log_growth = _oracle_positions_loop(ask, bid, fee, fee)
+        np.testing.assert_array_equal(positions, expected)
+        np.testing.assert_allclose(log_growth, expected_log_growth)
+        assert positions[0] == -1
+
+
+def test_crypto_oracle_actions():
+    df = CRYPTO_ETHUSDT_5M.iloc[:2000]
+    env = CryptoEnv(df.Close, df.High, df.Low, df, 10, (10, len(df)))
+    actions, positions = env.oracle_actions()
+
+    result = env.replay(actions)
+    np.testing.assert_array_equal(result.positions, positions)
+    assert result.info["Profit"] > 0
+    assert result.info["LoseTrades"] == 0
+
+    # fees make the oracle trade less
+    churn = CryptoEnv(df.Close, df.High, df.Low, df, 10, (10, len(df)), trade_fee=0.0)
+    assert len(churn.replay(churn.oracle_actions()[0]).trade_ticks) > len(
+        result.trade_ticks
+    )
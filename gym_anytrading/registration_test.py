@@ -0,0 +1,32 @@
+"""Registration Test"""
+
+import gymnasium as gym
+import pytest
+
+from gym_anytrading import _make_dataset_env, datasets
+
+IDS = [
+    env_id
+    for env_id, spec in gym.registry.items()
+    if getattr(spec.entry_point, "func", None) is _make_dataset_env
+]
+
+
+@pytest.mark.parametrize("env_id", IDS)
+def test_make(env_id):
+    # the registered dataset, cut short to keep envs2d recurrence plots cheap
+    dataset = gym.spec(env_id).entry_point.args[1]
+    env = gym.make(env_id, df=getattr(datasets, dataset).iloc[:300])
+    env.reset(seed=0)
+    env.step(env.action_space.sample())
+    env.close()
+
+
+def test_registered_ids():
+    assert sorted(IDS) == [
+        "crypto-v0",
+        "crypto-v1",
+        "crypto-v2",
+        "forex-v0",
+        "stocks-v0",
+    ]
@@ -0,0 +1,176 @@
+import numpy as np
+
+from .history import History
+from .reward import INFO_KEYS, METRIC_COLUMNS, _legacy_welford, rewards_of, welford
+from .typedefs import Actions, Metrics, RewardType
+
+
+class Replay:
+    """Episode of `replay`, one entry per step.
+
+    `positions[i]` (+1 long / -1 short), `rewards[i]` and row i of `history`
+    are those of the step to tick `ticks[i]`. `trade_ticks` are the ticks the
+    position was opened or reversed at and `info` is the info of the last
+    step.
+    """
+
+    def __init__(self, ticks, positions, trade_ticks, rewards, info, history):
+        self.ticks = ticks
+        self.positions = positions
+        self.trade_ticks = trade_ticks
+        self.rewards = rewards
+        self.info = info
+        self.history = history
+
+    @property
+    def total_reward(self):
+        return self.rewards.sum()
+
+
+def replay(env, actions):
+    """Step the discrete `envs.CryptoEnv` `env` through a whole episode.
+
+    Same positions, rewards, infos and history as `env.reset()` followed by
+    `env.step(action)` for each of the `env._end_tick - env._start_tick`
+    `actions`, computed with array operations over the trades (only the
+    Welford statistics loop over the closed trades). `env` is left untouched.
+    """
+    if env._mark_to_market:
+        raise ValueError("replay does not support mark_to_market envs")
+    num_steps = env._end_tick - env._start_tick
+    actions = np.asarray(actions)
+    if actions.shape != (num_steps,):
+        raise ValueError(f"Expected {num_steps} actions, got shape {actions.shape}")
+    if not np.isin(actions, (Actions.Buy.value, Actions.Sell.value)).all():
+        raise ValueError("actions must be Buy (0) or Sell (1)")
+
+    # Buy goes (or stays) long and Sell short, from a short position at reset
+    ticks = np.arange(env._start_tick + 1, env._end_tick + 1)
+    positions = (1 - 2 * actions).astype(np.int8)
+    trade = positions != np.concatenate(([-1], positions[:-1]))
+    trades = np.flatnonzero(trade)
+    trade_ticks = ticks[trades]
+
+    # metrics after 0, 1, ... closed trades and the row of each step: every
+    # trade but the first closes the entry of the previous one
+    metrics = _closed_trade_metrics(
+        env._reward_calculator, trade_ticks, positions[trades] > 0
+    )
+    rows = np.maximum(np.cumsum(trade) - 1, 0)
+
+    rewards = np.zeros(num_steps)
+    trade_rewards = rewards_of(metrics, env._reward_type)
+    rewards[trades] = (
+        trade_rewards[rows[trades]] - trade_rewards[np.maximum(rows[trades] - 1, 0)]
+    )
+
+    keys = INFO_KEYS if env._info_keys is None else env._info_keys
+    columns = [
+        (
+            rewards_of(metrics, RewardType[key])
+            if key in RewardType.__members__
+            else metrics[:, METRIC_COLUMNS[Metrics[key]]]
+        )
+        for key in keys
+    ]
+    info = {key: float(column[rows[-1]]) for key, column in zip(keys, columns)}
+
+    history = None
+    if env._history_retention != "off":
+        history = History.for_retention(env._history_retention, keys, num_steps)
+        history.extend(
+            np.stack([column[rows] for column in columns], axis=1)
+            if columns
+            else np.empty((num_steps, 0))
+        )
+
+    return Replay(ticks, positions, trade_ticks, rewards, info, history)
+
+
+def _closed_trade_metrics(calculator, trade_ticks, buy):
+    # `RewardCalculator.update` of each trade, as `(closed trades + 1,
+    # len(Metrics))` metrics rows
+    num_closed = max(len(trade_ticks) - 1, 0)
+    metrics = np.zeros((num_closed + 1, len(Metrics)))
+    if num_closed == 0:
+        return metrics
+
+    trade_prices = np.where(
+        buy, calculator._ask[trade_ticks], calculator._bid[trade_ticks]
+    )
+    entry_price, current_price = trade_prices[:-1], trade_prices[1:]
+    long = buy[:-1]
+    price_diff = np.where(
+        long, current_price - entry_price, entry_price - current_price
+    )
+    fee_percent = np.where(
+        long, calculator._trade_fee_ask_percent, calculator._trade_fee_bid_percent
+    )
+    pl = price_diff - np.abs(price_diff) * fee_percent
+
+    # 保有期間の最大ドローダウン
+    starts, stops = trade_ticks[:-1], trade_ticks[1:]
+    dd = np.where(
+        buy[1:],
+        calculator._ask_min.query_many(starts, stops) / entry_price - 1.0,
+        1.0 - calculator._bid_max.query_many(starts, stops) / entry_price,
+    )
+
+    returns = pl / entry_price + 1.0
+    log_returns = np.log(returns)
+    cumulative = np.cumsum(log_returns)
+    peak = np.maximum.accumulate(np.concatenate(([0.0], cumulative)))[1:]
+
+    # Welford の平均と分散は取引ごとに逐次計算する (RewardCalculator と同じ順序)
+    welford_rows = []
+    mean_pl = var_pl = mean_returns = var_returns = 0.0
+    mean_log = var_log = mean_down = var_down = 0.0
+    num_down = 0
+    for num, (p, r, lr) in enumerate(
+        zip(pl.tolist(), returns.tolist(), log_returns.tolist()), 1
+    ):
+        mean_pl, var_pl = _legacy_welford(mean_pl, var_pl, num, p)
+        mean_returns, var_returns = _legacy_welford(mean_returns, var_returns, num, r)
+        mean_log, var_log = welford(mean_log, var_log, num, lr)
+        if lr < 0:
+            num_down += 1
+            mean_down, var_down = welford(mean_down, var_down, num_down, lr)
+        welford_rows.append(
+            (
+                mean_pl,
+                var_pl,
+                mean_returns,
+                var_returns,
+                mean_log,
+                var_log,
+                mean_down,
+                var_down,
+            )
+        )
+    welford_columns = np.array(welford_rows).T
+
+    columns = {
+        Metrics.Trades: np.arange(1, num_closed + 1),
+        Metrics.LogReturns: cumulative,
+        Metrics.Profit: np.cumsum(np.maximum(pl, 0)),
+        Metrics.Loss: np.cumsum(np.minimum(pl, 0)),
+        Metrics.WinTrades: np.cumsum(pl > 0),
+        Metrics.LoseTrades: np.cumsum(pl < 0),
+        Metrics.MaxDD: np.minimum.accumulate(np.concatenate(([0.0], dd)))[1:],
+        Metrics.DownsideTrades: np.cumsum(log_returns < 0),
+        Metrics.PeakLogReturns: peak,
+        Metrics.ClosedMaxDD: np.minimum.accumulate(
+            np.concatenate(([0.0], np.expm1(cumulative - peak)))
+        )[1:],
+        Metrics.MeanPL: welford_columns[0],
+        Metrics.VarPL: welford_columns[1],
+        Metrics.MeanReturns: welford_columns[2],
+        Metrics.VarReturns: welford_columns[3],
+        Metrics.MeanLogReturns: welford_columns[4],
+        Metrics.VarLogReturns: welford_columns[5],
+        Metrics.MeanDownsideLogReturns: welford_columns[6],
+        Metrics.VarDownsideLogReturns: welford_columns[7],
+    }
+    for metric, values in columns.items():
+        metrics[1:, METRIC_COLUMNS[metric]] = values
+    return metrics
@@ -0,0 +1,67 @@
+"""Replay Test"""
+
+import numpy as np
+import pytest
+
+from gym_anytrading.datasets import CRYPTO_ETHUSDT_5M
+from gym_anytrading.envs import CryptoEnv
+from gym_anytrading.typedefs import RewardType
+
+
+@pytest.mark.parametrize(
+    "reward_type, history_retention",
+    [
+        (RewardType.LogReturns, "full"),
+        (RewardType.SQN, 7),
+        (RewardType.RecoveryFactor, "summary"),
+        (RewardType.SortinoRatio, "off"),
+    ],
+)
+def test_replay_matches_step(reward_type, history_retention):
+    df = CRYPTO_ETHUSDT_5M.iloc[:300]
+    env = CryptoEnv(
+        df.Close,
+        df.High,
+        df.Low,
+        df,
+        window_size=10,
+        frame_bound=(10, len(df)),
+        reward_type=reward_type,
+        history_retention=history_retention,
+    )
+    num_steps = env._end_tick - env._start_tick
+    actions = np.random.default_rng(0).integers(0, 2, num_steps)
+
+    result = env.replay(actions)
+
+    env.reset(seed=0)
+    trade_ticks = []
+    for i, action in enumerate(actions):
+        position = env._position
+        _, reward, _, _, info = env.step(action)
+        if env._position != position:
+            trade_ticks.append(env._current_tick)
+        assert result.ticks[i] == env._current_tick
+        assert result.positions[i] == 1 - 2 * env._position.value
+        np.testing.assert_equal(result.rewards[i], reward)
+
+    np.testing.assert_array_equal(result.trade_ticks, trade_ticks)
+    assert result.info.keys() == info.keys()
+    for key, value in info.items():
+        np.testing.assert_equal(result.info[key], value, err_msg=key)
+    if history_retention == "off":
+        assert result.history is None
+    else:
+        np.testing.assert_array_equal(result.history.to_numpy(), env.history.to_numpy())
+        assert result.history.num_steps == env.history.num_steps
+
+
+def test_replay_invalid_actions():
+    df = CRYPTO_ETHUSDT_5M.iloc[:50]
+    env = CryptoEnv(
+        df.Close, df.High, df.Low, df, window_size=10, frame_bound=(10, len(df))
+    )
+    with pytest.raises(ValueError):
+        env.replay(np.zeros(3, dtype=int))
+    with pytest.raises(ValueError):
+        env.replay(np.full(env._end_tick - env._start_tick, 2))
@@ -1,9 +1,290 @@
+from functools import cached_property
+
 from .typedefs import RewardType, Metrics, OrderAction, Position
 
 import numpy as np
 
+# Metrics are stored in float64 arrays, one row per calculator:
+# `RewardCalculator._metrics` is a `(len(Metrics),)` row and
+# `VectorRewardCalculator._metrics` stacks `num_envs` of them. Column of each
+# metric, its position in `Metrics` (whatever the enum values are):
+METRIC_COLUMNS = {m: i for i, m in enumerate(Metrics)}
+_METRIC_NAMES = [m.name for m in Metrics]
+_MEAN_PL = METRIC_COLUMNS[Metrics.MeanPL]
+_VAR_PL = METRIC_COLUMNS[Metrics.VarPL]
+_MEAN_RETURNS = METRIC_COLUMNS[Metrics.MeanReturns]
+_VAR_RETURNS = METRIC_COLUMNS[Metrics.VarReturns]
+_LOG_RETURNS = METRIC_COLUMNS[Metrics.LogReturns]
+_PROFIT = METRIC_COLUMNS[Metrics.Profit]
+_LOSS = METRIC_COLUMNS[Metrics.Loss]
+_TRADES = METRIC_COLUMNS[Metrics.Trades]
+_WIN_TRADES = METRIC_COLUMNS[Metrics.WinTrades]
+_LOSE_TRADES = METRIC_COLUMNS[Metrics.LoseTrades]
+_MAX_DD = METRIC_COLUMNS[Metrics.MaxDD]
+_MEAN_LOG_RETURNS = METRIC_COLUMNS[Metrics.MeanLogReturns]
+_VAR_LOG_RETURNS = METRIC_COLUMNS[Metrics.VarLogReturns]
+_DOWNSIDE_TRADES = METRIC_COLUMNS[Metrics.DownsideTrades]
+_MEAN_DOWNSIDE_LOG_RETURNS = METRIC_COLUMNS[Metrics.MeanDownsideLogReturns]
+_VAR_DOWNSIDE_LOG_RETURNS = METRIC_COLUMNS[Metrics.VarDownsideLogReturns]
+_PEAK_LOG_RETURNS = METRIC_COLUMNS[Metrics.PeakLogReturns]
+_CLOSED_MAX_DD = METRIC_COLUMNS[Metrics.ClosedMaxDD]
+_LOG_EQUITY = METRIC_COLUMNS[Metrics.LogEquity]
+_LOG_PEAK_EQUITY = METRIC_COLUMNS[Metrics.LogPeakEquity]
+_EQUITY_MAX_DD = METRIC_COLUMNS[Metrics.EquityMaxDD]
+
+# Metrics and rewards only maintained in mark-to-market mode
+_MTM_METRICS = {Metrics.LogEquity, Metrics.LogPeakEquity, Metrics.EquityMaxDD}
+_MTM_REWARDS = {
+    RewardType.EquityLogReturns,
+    RewardType.Drawdown,
+    RewardType.EquityMaxDD,
+    RewardType.DDPenalizedLogReturns,
+}
+
+# Keys of `get_info()`, plus `MTM_INFO_KEYS` in mark-to-market mode. Reward
+# values win over metrics of the same name (e.g. "MaxDD" is reported as a
+# percentage).
+INFO_KEYS = tuple(
+    dict.fromkeys(
+        [
+            *(m.name for m in Metrics if m not in _MTM_METRICS),
+            *(rt.name for rt in RewardType if rt not in _MTM_REWARDS),
+        ]
+    )
+)
+MTM_INFO_KEYS = tuple(
+    dict.fromkeys(
+        [
+            *(m.name for m in Metrics if m in _MTM_METRICS),
+            *(rt.name for rt in RewardType if rt in _MTM_REWARDS),
+        ]
+    )
+)
+
+
+def check_info_keys(info_keys, mark_to_market=False):
+    """Validate the `info_keys` option of the envs (None: all keys)."""
+    if info_keys is None:
+        return None
+    info_keys = tuple(info_keys)
+    known = INFO_KEYS + (MTM_INFO_KEYS if mark_to_market else ())
+    unknown = [key for key in info_keys if key not in known]
+    if unknown:
+        raise ValueError(f"Unknown info keys {unknown}, expected some of {known}")
+    return info_keys
+
+
+def check_reward_type(reward_type, mark_to_market=False):
+    """Validate the `reward_type` option of the envs: the equity based rewards
+    are only maintained in mark-to-market mode."""
+    if reward_type in _MTM_REWARDS and not mark_to_market:
+        raise ValueError(f"{reward_type} needs mark_to_market=True")
+    return reward_type
+
+
+def welford(mean, m2, num, value):
+    """Welford's algorithm https://zenn.dev/utcarnivaldayo/articles/ffeed5ac2e62bb
+
+    Running mean and sum of squared deviations `m2` updated with `value`, the
+    `num`-th value (floats, or arrays updated element-wise).
+    """
+    delta = value - mean
+    mean = mean + delta / num
+    return mean, m2 + delta * (value - mean)
+
+
+def _legacy_welford(mean, m2, num, value):
+    # MeanPL, VarPL, MeanReturns and VarReturns have always divided by one
+    # more than the number of values (`num` counting `value`); kept as is so
+    # that their values, and AHPR and SQN derived from them, do not change
+    return welford(mean, m2, num + 1, value)
+
+
+def price_array(values, frame_bound=None, window_size=0):
+    """`values` as a contiguous float64 array, indexed positionally by tick.
+
+    With `frame_bound`, only the ticks of an env trading that frame are kept,
+    i.e. `values[frame_bound[0] - window_size : frame_bound[1]]`.
+    """
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    if values.ndim != 1:
+        raise ValueError(f"prices must be 1-D, got shape {values.shape}")
+    if frame_bound is not None:
+        start, end = frame_bound[0] - window_size, frame_bound[1]
+        if not 0 <= start < end <= len(values):
+            raise ValueError(
+                f"frame_bound {tuple(frame_bound)} with window_size {window_size} "
+                f"is out of range for {len(values)} prices"
+            )
+        values = values[start:end]
+    return values
+
+
+def _aligned_prices(prices, ask, bid, frame_bound, window_size):
+    prices, ask, bid = (
+        None if values is None else price_array(values, frame_bound, window_size)
+        for values in (prices, ask, bid)
+    )
+    if len({len(values) for values in (prices, ask, bid) if values is not None}) > 1:
+        raise ValueError("prices, ask and bid must have the same length")
+    return prices, ask, bid
+
+
+class SparseTable:
+    """Minimum (or maximum) of any range of `values` in O(1).
 
-class RewardCalculator:
+    Row k of the table holds `op` over every window of 2**k values, so a
+    range is covered by the two (overlapping) windows of its largest power of
+    two. Setup costs O(n log n) time and memory.
+    """
+
+    def __init__(self, values, op=np.minimum):
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        n = len(values)
+        self._op = op
+        self._table = np.empty((max(n, 1).bit_length(), n))
+        self._table[0] = values
+        for k in range(1, len(self._table)):
+            half = 1 << (k - 1)
+            end = n - 2 * half + 1
+            op(
+                self._table[k - 1, :end],
+                self._table[k - 1, half : half + end],
+                out=self._table[k, :end],
+            )
+
+    def query(self, start, stop):
+        """`op` over `values[start:stop]`, nan for an empty slice."""
+        start, stop, _ = slice(start, stop).indices(self._table.shape[1])
+        if stop <= start:
+            return np.nan
+        k = (stop - start).bit_length() - 1
+        row = self._table[k]
+        return self._op(row[start], row[stop - (1 << k)])
+
+    def query_many(self, starts, stops):
+        """`query` of non-empty ranges given as arrays of non-negative bounds."""
+        k = np.frexp(stops - starts)[1] - 1  # floor(log2(length))
+        return self._op(
+            self._table[k, starts], self._table[k, stops - np.left_shift(1, k)]
+        )
+
+
+def rewards_of(metrics, reward_type: RewardType) -> np.ndarray:
+    """Rewards of each row of a `(n, len(Metrics))` metrics array.
+
+    The single implementation of the reward formulas, shared by
+    `RewardCalculator` (one row) and `VectorRewardCalculator`.
+    """
+    m = metrics.T
+    trades, win, lose = (
+        m[_TRADES],
+        m[_WIN_TRADES],
+        m[_LOSE_TRADES],
+    )
+    profit, loss = m[_PROFIT], m[_LOSS]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        match reward_type:
+            case RewardType.Profit:
+                return profit.copy()
+            case RewardType.Returns:
+                return np.expm1(m[_LOG_RETURNS]) * 100  # percentage
+            case RewardType.LogReturns:
+                return m[_LOG_RETURNS].copy()
+            case RewardType.MaxDD:
+                return m[_MAX_DD] * 100  # percentage
+            case RewardType.WinRate:
+                return np.where(trades == 0, 0.0, win / trades)
+            case RewardType.ProfitPerTrade:
+                return np.where(trades == 0, 0.0, profit / trades)
+            case RewardType.ProfitFactor:
+                return np.where(lose == 0, 0.0, -profit / loss)
+            case RewardType.PesimisticProfitFactor:
+                return np.where(
+                    (win == 0) | (lose == 0),
+                    0.0,
+                    -((win - np.sqrt(win)) * (profit / win))
+                    / ((lose + np.sqrt(lose)) * loss / lose),
+                )
+            case RewardType.KellyCriterion:
+                return np.where(
+                    (win == 0) | (lose == 0),
+                    0.0,
+                    win / trades - (1 - win / trades) / (profit / win) / (loss / lose),
+                )
+            case RewardType.GHPR:
+                return np.where(
+                    trades == 0,
+                    0.0,
+                    np.exp(m[_LOG_RETURNS] / trades),
+                )
+            case RewardType.AHPR:
+                return m[_MEAN_RETURNS].copy()
+            case RewardType.SQN:
+                return np.where(
+                    m[_VAR_PL] == 0.0,
+                    0.0,
+                    np.sqrt(trades) * m[_MEAN_PL] / np.sqrt(m[_VAR_PL]),
+                )
+            case RewardType.RecoveryFactor:
+                max_dd = m[_MAX_DD]
+                return -np.exp(m[_LOG_RETURNS]) / np.where(
+                    max_dd == 0.0, np.nan, max_dd
+                )
+            case RewardType.SharpeRatio:
+                var = m[_VAR_LOG_RETURNS]
+                return np.where(
+                    var == 0.0,
+                    0.0,
+                    m[_MEAN_LOG_RETURNS] / np.sqrt(var / trades),
+                )
+            case RewardType.SortinoRatio:
+                # 下方偏差 = sqrt(sum(min(r, 0) ** 2) / Trades)
+                downside = m[_DOWNSIDE_TRADES]
+                downside_squares = (
+                    m[_VAR_DOWNSIDE_LOG_RETURNS]
+                    + downside * m[_MEAN_DOWNSIDE_LOG_RETURNS] ** 2
+                )
+                return np.where(
+                    downside == 0,
+                    0.0,
+                    m[_MEAN_LOG_RETURNS] / np.sqrt(downside_squares / trades),
+                )
+            case RewardType.CalmarRatio:
+                closed_max_dd = m[_CLOSED_MAX_DD]
+                return np.where(
+                    closed_max_dd == 0.0,
+                    0.0,
+                    -m[_MEAN_LOG_RETURNS] / closed_max_dd,
+                )
+            case RewardType.RoMaD:
+                max_dd = m[_MAX_DD]
+                return np.where(max_dd == 0.0, 0.0, -np.expm1(m[_LOG_RETURNS]) / max_dd)
+            case RewardType.EquityLogReturns:
+                return m[_LOG_EQUITY].copy()
+            case RewardType.Drawdown:
+                return np.expm1(m[_LOG_EQUITY] - m[_LOG_PEAK_EQUITY]) * 100
+            case RewardType.EquityMaxDD:
+                return m[_EQUITY_MAX_DD] * 100  # percentage
+            case RewardType.DDPenalizedLogReturns:
+                return m[_LOG_EQUITY] + np.log1p(m[_EQUITY_MAX_DD])
+            case _:
+                raise NotImplementedError
+
+
+class _DrawdownTables:
+    # range extrema for the drawdown of a holding period, built on the first
+    # drawdown query: the tables take O(n log n) memory
+    @cached_property
+    def _ask_min(self):
+        return SparseTable(self._ask, np.minimum)
+
+    @cached_property
+    def _bid_max(self):
+        return SparseTable(self._bid, np.maximum)
+
+
+class RewardCalculator(_DrawdownTables):
     def __init__(
         self,
         trade_fee_ask_percent,
@@ -11,9 +292,14 @@ class RewardCalculator:
         prices=None,
         ask=None,
         bid=None,
+        frame_bound=None,
+        window_size=0,
+        mark_to_market=False,
     ):
+        # aligned float64 arrays, so that ticks index them positionally
+        prices, ask, bid = _aligned_prices(prices, ask, bid, frame_bound, window_size)
         if ask is not None and bid is not None:
-            assert len(ask) == len(bid)
+            self._prices = None
             self._ask, self._bid = ask, bid
         elif prices is not None:
             self._prices = prices
@@ -21,12 +307,21 @@ class RewardCalculator:
             raise ValueError("Must provide prices or (ask and bid).")
         self._trade_fee_ask_percent = trade_fee_ask_percent
         self._trade_fee_bid_percent = trade_fee_bid_percent
-        self._metrics = {m: 0.0 for m in Metrics}
-        self._amount_history = []
-        self._trade_price_history = []
+        self._metrics = np.zeros(len(Metrics))
+        # 建玉の累計: 数量 (符号付き)、取得価格 x 数量の合計、最初の取得価格
+        self._quantity = 0.0
+        self._cost_basis = 0.0
+        self._entry_price = None
+        # rewards and infos computed since the last metrics update
+        self._rewards = {}
+        self._infos = {}
+        # mark-to-market mode: `mark_to_market()` revalues the open entry
+        # every tick, for the dense equity based rewards
+        self._mark_to_market = mark_to_market
+        self._info_keys = INFO_KEYS + (MTM_INFO_KEYS if mark_to_market else ())
 
     def _trade_price(self, tick, action: OrderAction):
-        if hasattr(self, "_prices") and self._prices is not None:
+        if self._prices is not None:
             return self._prices[tick]
         else:
             if action > 0.0:
@@ -45,34 +340,84 @@ class RewardCalculator:
         assert (
             last_trade_tick < current_tick
         ), f"last_trade_tick: {last_trade_tick} >= current_tick: {current_tick}"
-        entry_price = self._trade_price_history[0]
+        entry_price = self._entry_price
         if action > 0.0:
-            dd = np.min(self._ask[last_trade_tick:current_tick]) / entry_price - 1.0
-            self._metrics[Metrics.MaxDD] = min(dd, self._metrics[Metrics.MaxDD])
+            dd = self._ask_min.query(last_trade_tick, current_tick) / entry_price - 1.0
+            self._metrics[_MAX_DD] = min(dd, self._metrics[_MAX_DD])
         elif action < 0.0:
-            dd = 1.0 - np.max(self._bid[last_trade_tick:current_tick]) / entry_price
-            self._metrics[Metrics.MaxDD] = min(dd, self._metrics[Metrics.MaxDD])
+            dd = 1.0 - self._bid_max.query(last_trade_tick, current_tick) / entry_price
+            self._metrics[_MAX_DD] = min(dd, self._metrics[_MAX_DD])
         else:
             raise ValueError("Invalid position")
 
     def reset(self):
-        self._metrics = {m: 0.0 for m in Metrics}
+        self._metrics.fill(0.0)
+        self._clear_entries()
+        self._rewards.clear()
+        self._infos.clear()
 
-    @staticmethod
-    def __welford_update(old_mean, old_var, num, new_val):
-        # Welford's algorithm https://zenn.dev/utcarnivaldayo/articles/ffeed5ac2e62bb
-        tmp = old_mean + (new_val - old_mean) / (num + 1)
-        var = old_var + (new_val - old_mean) * (new_val - tmp)
-        return tmp, var
+    def _clear_entries(self):
+        self._quantity = 0.0
+        self._cost_basis = 0.0
+        self._entry_price = None
+
+    def _add_entry(self, amount, price):
+        # 建玉を追加する (O(1)、リストを持たない)
+        self._quantity += amount
+        self._cost_basis += price * amount
+        if self._entry_price is None:
+            self._entry_price = price
+
+    def _reduce_entry(self, remaining):
+        # 建玉を remaining (0~1) の割合だけ残す (平均取得価格は変わらない、O(1))
+        self._quantity *= remaining
+        self._cost_basis *= remaining
+
+    def _average_trade_price(self):
+        # 数量で加重した平均取得価格、数量の合計が0なら最初の取得価格
+        if self._quantity == 0:
+            return self._entry_price
+        return self._cost_basis / self._quantity
+
+    # update the mark-to-market equity, its peak and drawdown at `tick` in O(1)
+    def mark_to_market(self, tick):
+        assert self._mark_to_market, "RewardCalculator(mark_to_market=True) only"
+        amount = self._quantity
+        m = self._metrics
+        log_equity = m[_LOG_RETURNS]
+        if amount != 0.0:
+            average_trade_price = self._average_trade_price()
+            # 決済した場合と同じ価格と手数料で評価損益を計算する
+            long = amount > 0
+            current_price = self._trade_price(tick, -1.0 if long else 1.0)
+            price_diff = (
+                current_price - average_trade_price
+                if long
+                else average_trade_price - current_price
+            )
+            fee_percent = (
+                self._trade_fee_ask_percent if long else self._trade_fee_bid_percent
+            )
+            unrealized_pl = (
+                price_diff * abs(amount) - abs(price_diff) * abs(amount) * fee_percent
+            )
+            log_equity += np.log1p(unrealized_pl / self._entry_price)
+
+        log_peak_equity = max(log_equity, m[_LOG_PEAK_EQUITY])
+        drawdown = np.expm1(log_equity - log_peak_equity)
+        m[_LOG_EQUITY] = log_equity
+        m[_LOG_PEAK_EQUITY] = log_peak_equity
+        m[_EQUITY_MAX_DD] = min(drawdown, m[_EQUITY_MAX_DD])
+
+        for reward_type in _MTM_REWARDS:
+            self._rewards.pop(reward_type, None)
+        self._infos.clear()
 
     # update metrics
     def update(
         self, position: Position, action: OrderAction, current_tick, last_trade_tick
     ):
         current_price = self._trade_price(current_tick, action)
-        assert len(self._trade_price_history) == len(
-            self._amount_history
-        ), f"trade_price_history: {len(self._trade_price_history)} != amount_history: {len(self._amount_history)}"
 
         # if position == 0 or sum(self._amount_history) == 0:
         #     self._amount_history.clear()
@@ -87,48 +432,49 @@ class RewardCalculator:
             offset_amount = min(abs(position), abs(action))
             new_position_amount = abs(action) - offset_amount
 
-            # 相殺部分の損益計算
-            if self._amount_history.sum() == 0:
-                average_trade_price = np.mean(self._trade_price_history)
-            else:
-                average_trade_price = np.average(
-                    self._trade_price_history, weights=self._amount_history
-                )
+            # 記録済みの建玉がない場合（初期ポジションなど）は損益を計算しない
+            if self._entry_price is not None:
+                # 相殺部分の損益計算
+                average_trade_price = self._average_trade_price()
 
-            price_diff = (
-                current_price - average_trade_price
-                if position > 0
-                else average_trade_price - current_price
-            )
-            offset_pl = price_diff * offset_amount - abs(price_diff) * offset_amount * (
-                self._trade_fee_ask_percent
-                if position > 0
-                else self._trade_fee_bid_percent
-            )
+                price_diff = (
+                    current_price - average_trade_price
+                    if position > 0
+                    else average_trade_price - current_price
+                )
+                fee_percent = (
+                    self._trade_fee_ask_percent
+                    if position > 0
+                    else self._trade_fee_bid_percent
+                )
+                offset_pl = (
+                    price_diff * offset_amount
+                    - abs(price_diff) * offset_amount * fee_percent
+                )
 
-            # 最大ドローダウンの更新
-            self._update_max_dd(action, current_tick, last_trade_tick)
-            # メトリクス更新
-            self._update_metrics(offset_pl)
+                # 最大ドローダウンの更新
+                self._update_max_dd(action, current_tick, last_trade_tick)
+                # メトリクス更新
+                self._update_metrics(offset_pl)
 
-            # ポジションが反転する場合、履歴をクリア
-            if (position + action) * position < 0:
-                self._amount_history.clear()
-                self._trade_price_history.clear()
+            # ポジションが0になるか反転する場合は履歴をクリア、
+            # 一部の相殺なら相殺した割合だけ建玉を減らす
+            if (position + action) * position <= 0:
+                self._clear_entries()
+            elif self._entry_price is not None:
+                self._reduce_entry(1.0 - offset_amount / abs(position))
 
             # 新規ポジションの追加
             if new_position_amount > 0:
-                self._amount_history.append(
-                    new_position_amount * (1 if action > 0 else -1)
+                self._add_entry(
+                    new_position_amount * (1 if action > 0 else -1), current_price
                 )
-                self._trade_price_history.append(current_price)
 
         else:
-            self._amount_history.clear()
-            self._trade_price_history.clear()
-            # ポジションが0の場合、新規ポジションとして扱う
-            self._amount_history.append(action)
-            self._trade_price_history.append(current_price)
+            # 同方向なら建玉に追加、ポジションが0の場合は新規ポジションとして扱う
+            if position * action <= 0:
+                self._clear_entries()
+            self._add_entry(action, current_price)
             return  # 損益計算やメトリクスの更新は行わない
 
             # # ポジションとアクションが同じ方向の場合、通常の損益計算
@@ -153,143 +499,294 @@ class RewardCalculator:
             # self._update_metrics(pl)
 
     def _update_metrics(self, pl):
+        # 配列要素の読み書きを避けるため Python の float のリストで更新する
+        m = self._metrics.tolist()
+
         # 損益の平均と分散を更新するために Welford のアルゴリズムを使用
-        num_trades = self._metrics[Metrics.Trades] + 1  # 新しい取引をカウントに追加
-        old_mean_pl = self._metrics[Metrics.MeanPL]
-        old_var_pl = self._metrics[Metrics.VarPL]
-        old_mean_returns = self._metrics[Metrics.MeanReturns]
-        old_var_returns = self._metrics[Metrics.VarReturns]
+        num_trades = m[_TRADES] + 1  # 新しい取引をカウントに追加
 
-        entry_price = self._trade_price_history[0]
+        entry_price = self._entry_price
         returns = pl / entry_price + 1.0
 
         # Welford のアルゴリズムで平均と分散を更新
-        new_mean_pl, new_var_pl = self.__welford_update(
-            old_mean_pl, old_var_pl, num_trades, pl
+        m[_MEAN_PL], m[_VAR_PL] = _legacy_welford(
+            m[_MEAN_PL], m[_VAR_PL], num_trades, pl
         )
-        new_mean_returns, new_var_returns = self.__welford_update(
-            old_mean_returns, old_var_returns, num_trades, returns
+        m[_MEAN_RETURNS], m[_VAR_RETURNS] = _legacy_welford(
+            m[_MEAN_RETURNS], m[_VAR_RETURNS], num_trades, returns
         )
-
-        self._metrics[Metrics.MeanPL] = new_mean_pl
-        self._metrics[Metrics.VarPL] = new_var_pl
-        self._metrics[Metrics.MeanReturns] = new_mean_returns
-        self._metrics[Metrics.VarReturns] = new_var_returns
-        self._metrics[Metrics.Trades] = num_trades
+        m[_TRADES] = num_trades
 
         # ログリターンの更新
-        self._metrics[Metrics.LogReturns] += np.log(returns)
+        log_returns = np.log(returns)
+        m[_LOG_RETURNS] += log_returns
+
+        # シャープ・ソルティノレシオ用のログリターンの平均と分散 (下方のみも)
+        m[_MEAN_LOG_RETURNS], m[_VAR_LOG_RETURNS] = welford(
+            m[_MEAN_LOG_RETURNS], m[_VAR_LOG_RETURNS], num_trades, log_returns
+        )
+        if log_returns < 0:
+            m[_DOWNSIDE_TRADES] += 1
+            m[_MEAN_DOWNSIDE_LOG_RETURNS], m[_VAR_DOWNSIDE_LOG_RETURNS] = welford(
+                m[_MEAN_DOWNSIDE_LOG_RETURNS],
+                m[_VAR_DOWNSIDE_LOG_RETURNS],
+                m[_DOWNSIDE_TRADES],
+                log_returns,
+            )
+
+        # 確定損益のエクイティの最大値と最大ドローダウン
+        m[_PEAK_LOG_RETURNS] = max(m[_PEAK_LOG_RETURNS], m[_LOG_RETURNS])
+        m[_CLOSED_MAX_DD] = min(
+            m[_CLOSED_MAX_DD], np.expm1(m[_LOG_RETURNS] - m[_PEAK_LOG_RETURNS])
+        )
 
         # 損益に基づいてその他のメトリクスを更新
-        self._metrics[Metrics.Profit] += max(pl, 0)
-        self._metrics[Metrics.Loss] += min(pl, 0)
-        self._metrics[Metrics.WinTrades] += 1 if pl > 0 else 0
-        self._metrics[Metrics.LoseTrades] += 1 if pl < 0 else 0
+        m[_PROFIT] += max(pl, 0)
+        m[_LOSS] += min(pl, 0)
+        m[_WIN_TRADES] += 1 if pl > 0 else 0
+        m[_LOSE_TRADES] += 1 if pl < 0 else 0
 
-    # calculate reward based on metrics
+        self._metrics[:] = m
+        self._rewards.clear()
+        self._infos.clear()
+
+    # calculate reward based on metrics, cached until the next update
     def reward(self, reward_type: RewardType) -> float | None:
-        match reward_type:
-            case RewardType.Profit:
-                return self._metrics[Metrics.Profit]
-            case RewardType.Returns:
-                return np.expm1(self._metrics[Metrics.LogReturns]) * 100  # percentage
-            case RewardType.LogReturns:
-                return self._metrics[Metrics.LogReturns]
-            case RewardType.MaxDD:
-                return self._metrics[Metrics.MaxDD] * 100  # percentage
-            case RewardType.WinRate:
-                if self._metrics[Metrics.Trades] == 0:
-                    return 0.0
-                return self._metrics[Metrics.WinTrades] / self._metrics[Metrics.Trades]
-            case RewardType.ProfitPerTrade:
-                if self._metrics[Metrics.Trades] == 0:
-                    return 0.0
-                return self._metrics[Metrics.Profit] / self._metrics[Metrics.Trades]
-            case RewardType.ProfitFactor:
-                if self._metrics[Metrics.LoseTrades] == 0:
-                    return 0.0
-                return -self._metrics[Metrics.Profit] / (self._metrics[Metrics.Loss])
-            case RewardType.PesimisticProfitFactor:
-                if (
-                    self._metrics[Metrics.WinTrades] == 0
-                    or self._metrics[Metrics.LoseTrades] == 0
-                ):
-                    return 0.0
-                return -(
-                    (
-                        self._metrics[Metrics.WinTrades]
-                        - np.sqrt(self._metrics[Metrics.WinTrades])
-                    )
-                    * (
-                        self._metrics[Metrics.Profit]
-                        / (self._metrics[Metrics.WinTrades])
-                    )
-                ) / (
-                    (
-                        self._metrics[Metrics.LoseTrades]
-                        + np.sqrt(self._metrics[Metrics.LoseTrades])
-                    )
-                    * self._metrics[Metrics.Loss]
-                    / (self._metrics[Metrics.LoseTrades])
-                )
-            case RewardType.KellyCriterion:
-                if (
-                    self._metrics[Metrics.WinTrades] == 0
-                    or self._metrics[Metrics.LoseTrades] == 0
-                ):
-                    return 0.0
-                return self._metrics[Metrics.WinTrades] / self._metrics[
-                    Metrics.Trades
-                ] - (
-                    1 - self._metrics[Metrics.WinTrades] / self._metrics[Metrics.Trades]
-                ) / (
-                    self._metrics[Metrics.Profit] / (self._metrics[Metrics.WinTrades])
-                ) / (
-                    (self._metrics[Metrics.Loss] / (self._metrics[Metrics.LoseTrades]))
-                )
-            case RewardType.GHPR:
-                if self._metrics[Metrics.Trades] == 0:
-                    return 0.0
-                return np.power(
-                    np.exp(self._metrics[Metrics.LogReturns]),
-                    1 / (self._metrics[Metrics.Trades]),
-                )
-            case RewardType.AHPR:
-                return self._metrics[Metrics.MeanReturns]
-            case RewardType.SQN:
-                if self._metrics[Metrics.VarPL] == 0.0:
-                    return 0.0
-                return (
-                    np.sqrt(self._metrics[Metrics.Trades])
-                    * self._metrics[Metrics.MeanPL]
-                    / np.sqrt(self._metrics[Metrics.VarPL])
-                )
-            case RewardType.RecoveryFactor:
-                return -np.exp(self._metrics[Metrics.LogReturns]) / (
-                    self._metrics[Metrics.MaxDD] or np.nan
+        try:
+            return self._rewards[reward_type]
+        except KeyError:
+            value = self._rewards[reward_type] = self._reward(reward_type)
+            return value
+
+    def _reward(self, reward_type: RewardType) -> float | None:
+        check_reward_type(reward_type, self._mark_to_market)
+        return rewards_of(self._metrics[None], reward_type)[0]
+
+    def get_info(self, keys=None):
+        """Metrics and rewards by name, only `keys` of them if given."""
+        if keys is not None:
+            keys = tuple(keys)
+        info = self._infos.get(keys)
+        if info is None:
+            metrics = dict(zip(_METRIC_NAMES, self._metrics.tolist()))
+            info = self._infos[keys] = {
+                key: (
+                    float(self.reward(RewardType[key]))
+                    if key in RewardType.__members__
+                    else metrics[key]
                 )
-            # case RewardType.SharpeRatio:
-            #     return np.prod([r for r in self._returns if r > 1.0]) / (
-            #         np.std(self._returns) or np.nan
-            #     )
-            # case RewardType.SortinoRatio:
-            #     if np.std([r for r in self._returns if r < 1.0]) == 0.0:
-            #         return np.nan
-            #     return np.prod([r for r in self._returns if r > 1.0]) / np.std(
-            #         [r for r in self._returns if r < 1.0]
-            #     )
-            # case RewardType.RoMaD:
-            #     if len([pl for pl in self._pl if pl < 0]) == 0:
-            #         return -1e10
-            #     return (
-            #         -self._metrics[Metrics.MeanPL]
-            #         * self._metrics[Metrics.Trades]
-            #         / (min([pl for pl in self._pl if pl < 0]))
-            #     )
-            case _:
-                raise NotImplementedError
+                for key in (self._info_keys if keys is None else keys)
+            }
+        return info.copy()
+
+
+class VectorRewardCalculator(_DrawdownTables):
+    """`RewardCalculator` for `num_envs` envs stepped together.
 
-    def get_info(self):
-        return {m.name: float(self._metrics[m]) for m in Metrics} | {
-            rt.name: float(self.reward(rt)) for rt in RewardType
+    The envs only ever hold one open entry (opening from flat or reversing
+    replaces it, scaling in adds to it, a partial offset scales it down and
+    closing clears it), so the ledger reduces to the running totals of one
+    entry per env. Metrics
+    are a `(num_envs, len(Metrics))` array, i.e. `RewardCalculator._metrics`
+    rows stacked, updated with the same float operations as
+    `RewardCalculator`, which keeps the rewards bit-identical.
+    """
+
+    def __init__(
+        self,
+        num_envs,
+        trade_fee_ask_percent,
+        trade_fee_bid_percent,
+        ask,
+        bid,
+        frame_bound=None,
+        window_size=0,
+    ):
+        _, self._ask, self._bid = _aligned_prices(
+            None, ask, bid, frame_bound, window_size
+        )
+        self._trade_fee_ask_percent = trade_fee_ask_percent
+        self._trade_fee_bid_percent = trade_fee_bid_percent
+        self._metrics = np.zeros((num_envs, len(Metrics)))
+        # `RewardCalculator` の建玉の累計: 最初の取得価格 (nan: 建玉なし)、
+        # 数量 (符号付き)、取得価格 x 数量の合計
+        self._entry_price = np.full(num_envs, np.nan)
+        self._entry_amount = np.zeros(num_envs)
+        self._entry_cost = np.zeros(num_envs)
+        # rewards computed since the last metrics update
+        self._rewards = {}
+
+    def reset(self, envs=slice(None)):
+        self._metrics[envs] = 0.0
+        if self._rewards and self._metrics[envs].size:
+            self._rewards.clear()
+        self._entry_price[envs] = np.nan
+        self._entry_amount[envs] = 0.0
+        self._entry_cost[envs] = 0.0
+
+    # update metrics of the sub-envs `envs` which trade `action`
+    def update(self, envs, position, action, current_tick, last_trade_tick):
+        current_price = np.where(
+            action > 0, self._ask[current_tick], self._bid[current_tick]
+        )
+
+        # ポジションとアクションが反対の場合、相殺処理を行う
+        offset = position * action < 0
+        offset_amount = np.minimum(np.abs(position), np.abs(action))
+        new_position_amount = np.abs(action) - offset_amount
+
+        # 記録済みの建玉がある環境のみ損益を確定する
+        closing = offset & ~np.isnan(self._entry_price[envs])
+        if closing.any():
+            self._close(
+                envs[closing],
+                position[closing],
+                action[closing],
+                offset_amount[closing],
+                current_price[closing],
+                current_tick[closing],
+                last_trade_tick[closing],
+            )
+
+        # ポジションが0になる場合は建玉をクリア、一部の相殺なら相殺した割合
+        # だけ建玉を減らす
+        flat = offset & (position + action == 0)
+        self._entry_price[envs[flat]] = np.nan
+        self._entry_amount[envs[flat]] = 0.0
+        self._entry_cost[envs[flat]] = 0.0
+        partial = closing & ((position + action) * position > 0)
+        remaining = 1.0 - offset_amount[partial] / np.abs(position[partial])
+        self._entry_amount[envs[partial]] *= remaining
+        self._entry_cost[envs[partial]] *= remaining
+
+        # 同方向なら建玉に追加する (最初の取得価格はそのまま)
+        adding = position * action > 0
+        added = envs[adding]
+        self._entry_price[added] = np.where(
+            np.isnan(self._entry_price[added]),
+            current_price[adding],
+            self._entry_price[added],
+        )
+        self._entry_amount[added] += action[adding]
+        self._entry_cost[added] += (current_price * action)[adding]
+
+        # ポジションが反転する場合は反転後の建玉、
+        # ポジションが0の場合は新規の建玉を記録する
+        reverse = offset & ((position + action) * position < 0)
+        opening = ~offset & ~adding
+        amount = np.where(reverse, new_position_amount * np.sign(action), action)
+        entry = envs[reverse | opening]
+        self._entry_price[entry] = current_price[reverse | opening]
+        self._entry_amount[entry] = amount[reverse | opening]
+        self._entry_cost[entry] = (current_price * amount)[reverse | opening]
+
+    def _close(
+        self,
+        envs,
+        position,
+        action,
+        offset_amount,
+        current_price,
+        current_tick,
+        last_trade_tick,
+    ):
+        # 相殺部分の損益計算 (数量で加重した平均取得価格)
+        entry_price = self._entry_price[envs]
+        average_trade_price = self._entry_cost[envs] / self._entry_amount[envs]
+
+        long = position > 0
+        price_diff = np.where(
+            long,
+            current_price - average_trade_price,
+            average_trade_price - current_price,
+        )
+        fee_percent = np.where(
+            long, self._trade_fee_ask_percent, self._trade_fee_bid_percent
+        )
+        pl = (
+            price_diff * offset_amount
+            - np.abs(price_diff) * offset_amount * fee_percent
+        )
+
+        # 最大ドローダウンの更新
+        assert (last_trade_tick < current_tick).all()
+        min_ask = self._ask_min.query_many(last_trade_tick, current_tick)
+        max_bid = self._bid_max.query_many(last_trade_tick, current_tick)
+        dd = np.where(
+            action > 0, min_ask / entry_price - 1.0, 1.0 - max_bid / entry_price
+        )
+        max_dd = self._metrics[:, _MAX_DD]
+        max_dd[envs] = np.where(max_dd[envs] < dd, max_dd[envs], dd)
+
+        # メトリクス更新
+        m = self._metrics.T  # metric columns as rows
+        num_trades = m[_TRADES][envs] + 1
+        returns = pl / entry_price + 1.0
+        self._welford(_MEAN_PL, _VAR_PL, envs, num_trades, pl, _legacy_welford)
+        self._welford(
+            _MEAN_RETURNS, _VAR_RETURNS, envs, num_trades, returns, _legacy_welford
+        )
+        m[_TRADES][envs] = num_trades
+        log_returns = np.log(returns)
+        m[_LOG_RETURNS][envs] += log_returns
+        m[_PROFIT][envs] += np.maximum(pl, 0)
+        m[_LOSS][envs] += np.minimum(pl, 0)
+        m[_WIN_TRADES][envs] += pl > 0
+        m[_LOSE_TRADES][envs] += pl < 0
+
+        # ログリターンの平均と分散 (下方のみも)
+        self._welford(
+            _MEAN_LOG_RETURNS, _VAR_LOG_RETURNS, envs, num_trades, log_returns
+        )
+        down = log_returns < 0
+        num_downside = m[_DOWNSIDE_TRADES][envs[down]] + 1
+        m[_DOWNSIDE_TRADES][envs[down]] = num_downside
+        self._welford(
+            _MEAN_DOWNSIDE_LOG_RETURNS,
+            _VAR_DOWNSIDE_LOG_RETURNS,
+            envs[down],
+            num_downside,
+            log_returns[down],
+        )
+
+        # 確定損益のエクイティの最大値と最大ドローダウン (min/max of Python)
+        cumulative = m[_LOG_RETURNS][envs]
+        peak = m[_PEAK_LOG_RETURNS][envs]
+        peak = np.where(cumulative > peak, cumulative, peak)
+        m[_PEAK_LOG_RETURNS][envs] = peak
+        closed_dd = np.expm1(cumulative - peak)
+        closed_max_dd = m[_CLOSED_MAX_DD][envs]
+        m[_CLOSED_MAX_DD][envs] = np.where(
+            closed_dd < closed_max_dd, closed_dd, closed_max_dd
+        )
+        self._rewards.clear()
+
+    def _welford(self, mean, var, envs, num, value, update=welford):
+        # `welford` (or `_legacy_welford`) of the metric columns `mean` and `var`
+        m = self._metrics.T
+        m[mean][envs], m[var][envs] = update(m[mean][envs], m[var][envs], num, value)
+
+    # calculate rewards of all sub-envs based on metrics, cached (read-only)
+    # until the next update
+    def reward(self, reward_type: RewardType) -> np.ndarray:
+        rewards = self._rewards.get(reward_type)
+        if rewards is None:
+            rewards = self._rewards[reward_type] = self._reward(reward_type)
+            rewards.flags.writeable = False
+        return rewards
+
+    def _reward(self, reward_type: RewardType) -> np.ndarray:
+        check_reward_type(reward_type)  # no mark-to-market mode
+        return rewards_of(self._metrics, reward_type)
+
+    def get_info(self, keys=None):
+        """Metrics and rewards by name, only `keys` of them if given."""
+        metrics = self._metrics.T
+        return {
+            key: (
+                self.reward(RewardType[key])
+                if key in RewardType.__members__
+                else metrics[_METRIC_NAMES.index(key)].copy()
+            )
+            for key in (INFO_KEYS if keys is None else keys)
         }
@@ -1,10 +1,16 @@
-""" RewardCalculator Test """
+"""RewardCalculator Test"""
 
 import pytest
 import numpy as np
 
 from gym_anytrading.datasets import CRYPTO_ETHUSDT_5M
-from gym_anytrading.reward import RewardCalculator, RewardType
+from gym_anytrading.reward import (
+    RewardCalculator,
+    RewardType,
+    SparseTable,
+    VectorRewardCalculator,
+    check_info_keys,
+)
 
 
 def test_reward_calculator_initialization():
@@ -25,8 +31,9 @@ def test_reward_calculator_initialization():
 
     # チェック
     assert reward_calculator._metrics is not None
-    assert reward_calculator._trade_price_history == []
-    assert reward_calculator._amount_history == []
+    assert reward_calculator._quantity == 0.0
+    assert reward_calculator._cost_basis == 0.0
+    assert reward_calculator._entry_price is None
 
 
 def test_reward_calculator_update():
@@ -74,7 +81,7 @@ def test_reward_calculator_update():
     info = reward_calculator.get_info()
     assert (
         str(info)
-        == "{'MeanPL': 0.0, 'VarPL': 0.0, 'MeanReturns': 0.0, 'VarReturns': 0.0, 'LogReturns': 0.0, 'Profit': 0.0, 'Loss': 0.0, 'Trades': 0.0, 'WinTrades': 0.0, 'LoseTrades': 0.0, 'MaxDD': 0.0, 'Returns': 0.0, 'WinRate': 0.0, 'ProfitPerTrade': 0.0, 'ProfitFactor': 0.0, 'PesimisticProfitFactor': 0.0, 'KellyCriterion': 0.0, 'GHPR': 0.0, 'AHPR': 0.0, 'SQN': 0.0, 'RecoveryFactor': nan}"
+        == "{'MeanPL': 0.0, 'VarPL': 0.0, 'MeanReturns': 0.0, 'VarReturns': 0.0, 'LogReturns': 0.0, 'Profit': 0.0, 'Loss': 0.0, 'Trades': 0.0, 'WinTrades': 0.0, 'LoseTrades': 0.0, 'MaxDD': 0.0, 'MeanLogReturns': 0.0, 'VarLogReturns': 0.0, 'DownsideTrades': 0.0, 'MeanDownsideLogReturns': 0.0, 'VarDownsideLogReturns': 0.0, 'PeakLogReturns': 0.0, 'ClosedMaxDD': 0.0, 'Returns': 0.0, 'WinRate': 0.0, 'ProfitPerTrade': 0.0, 'ProfitFactor': 0.0, 'PesimisticProfitFactor': 0.0, 'KellyCriterion': 0.0, 'GHPR': 0.0, 'AHPR': 0.0, 'SQN': 0.0, 'RecoveryFactor': nan, 'SharpeRatio': 0.0, 'SortinoRatio': 0.0, 'CalmarRatio': 0.0, 'RoMaD': 0.0}"
     )
 
     # Step 1
@@ -94,7 +101,7 @@ def test_reward_calculator_update():
     info = reward_calculator.get_info()
     assert (
         str(info)
-        == "{'MeanPL': 0.0, 'VarPL': 0.0, 'MeanReturns': 0.0, 'VarReturns': 0.0, 'LogReturns': 0.0, 'Profit': 0.0, 'Loss': 0.0, 'Trades': 0.0, 'WinTrades': 0.0, 'LoseTrades': 0.0, 'MaxDD': 0.0, 'Returns': 0.0, 'WinRate': 0.0, 'ProfitPerTrade': 0.0, 'ProfitFactor': 0.0, 'PesimisticProfitFactor': 0.0, 'KellyCriterion': 0.0, 'GHPR': 0.0, 'AHPR': 0.0, 'SQN': 0.0, 'RecoveryFactor': nan}"
+        == "{'MeanPL': 0.0, 'VarPL': 0.0, 'MeanReturns': 0.0, 'VarReturns': 0.0, 'LogReturns': 0.0, 'Profit': 0.0, 'Loss': 0.0, 'Trades': 0.0, 'WinTrades': 0.0, 'LoseTrades': 0.0, 'MaxDD': 0.0, 'MeanLogReturns': 0.0, 'VarLogReturns': 0.0, 'DownsideTrades': 0.0, 'MeanDownsideLogReturns': 0.0, 'VarDownsideLogReturns': 0.0, 'PeakLogReturns': 0.0, 'ClosedMaxDD': 0.0, 'Returns': 0.0, 'WinRate': 0.0, 'ProfitPerTrade': 0.0, 'ProfitFactor': 0.0, 'PesimisticProfitFactor': 0.0, 'KellyCriterion': 0.0, 'GHPR': 0.0, 'AHPR': 0.0, 'SQN': 0.0, 'RecoveryFactor': nan, 'SharpeRatio': 0.0, 'SortinoRatio': 0.0, 'CalmarRatio': 0.0, 'RoMaD': 0.0}"
     )
 
     # Step 2
@@ -114,5 +121,224 @@ def test_reward_calculator_update():
     info = reward_calculator.get_info()
     assert (
         str(info)
-        == "{'MeanPL': -0.5706500000000552, 'VarPL': 0.6512828450001259, 'MeanReturns': 0.499646805060408, 'VarReturns': 0.4992938596141467, 'LogReturns': -0.0007066394900700643, 'Profit': 0.0, 'Loss': -1.1413000000001103, 'Trades': 1.0, 'WinTrades': 0.0, 'LoseTrades': 1.0, 'MaxDD': nan, 'Returns': -0.07063898791840328, 'WinRate': 0.0, 'ProfitPerTrade': 0.0, 'ProfitFactor': 0.0, 'PesimisticProfitFactor': 0.0, 'KellyCriterion': 0.0, 'GHPR': 0.999293610120816, 'AHPR': 0.499646805060408, 'SQN': -0.7071067811865476, 'RecoveryFactor': nan}"
+        == "{'MeanPL': 0.608850000000009, 'VarPL': 0.7413966450000219, 'MeanReturns': 0.5003768382352941, 'VarReturns': 0.5007539604846993, 'LogReturns': 0.00075339259909961, 'Profit': 1.217700000000018, 'Loss': 0.0, 'Trades': 1.0, 'WinTrades': 1.0, 'LoseTrades': 0.0, 'MaxDD': nan, 'MeanLogReturns': 0.00075339259909961, 'VarLogReturns': 0.0, 'DownsideTrades': 0.0, 'MeanDownsideLogReturns': 0.0, 'VarDownsideLogReturns': 0.0, 'PeakLogReturns': 0.00075339259909961, 'ClosedMaxDD': 0.0, 'Returns': 0.0753676470588216, 'WinRate': 1.0, 'ProfitPerTrade': 1.217700000000018, 'ProfitFactor': 0.0, 'PesimisticProfitFactor': 0.0, 'KellyCriterion': 0.0, 'GHPR': 1.0007536764705882, 'AHPR': 0.5003768382352941, 'SQN': 0.7071067811865475, 'RecoveryFactor': nan, 'SharpeRatio': 0.0, 'SortinoRatio': 0.0, 'CalmarRatio': 0.0, 'RoMaD': nan}"
     )
+
+
+def test_reward_calculator_scale_out():
+    ask = CRYPTO_ETHUSDT_5M["High"].to_numpy()
+    bid = CRYPTO_ETHUSDT_5M["Low"].to_numpy()
+    reward_calculator = RewardCalculator(0.001, 0.001, ask=ask, bid=bid)
+
+    # long 1 unit, closed in three parts at the same average price
+    reward_calculator.update(0.0, 1.0, 10, 9)
+    for position, action, tick, remaining in [
+        (1.0, -0.25, 20, 0.75),
+        (0.75, -0.5, 30, 0.25),
+    ]:
+        reward_calculator.update(position, action, tick, 10)
+        assert reward_calculator._quantity == pytest.approx(remaining)
+        assert reward_calculator._cost_basis == pytest.approx(ask[10] * remaining)
+        assert reward_calculator._average_trade_price() == pytest.approx(ask[10])
+        assert reward_calculator._entry_price == ask[10]
+
+    reward_calculator.update(0.25, -0.25, 40, 10)
+    assert reward_calculator._quantity == 0.0
+    assert reward_calculator._cost_basis == 0.0
+    assert reward_calculator._entry_price is None
+    # every part is priced at the average entry price, on its own amount
+    info = reward_calculator.get_info()
+    assert info["WinTrades"] == 3.0
+    assert info["Profit"] == pytest.approx(
+        sum(
+            amount * ((bid[tick] - ask[10]) - abs(bid[tick] - ask[10]) * 0.001)
+            for amount, tick in [(0.25, 20), (0.5, 30), (0.25, 40)]
+        )
+    )
+
+
+def test_reward_calculator_scale_in():
+    ask = CRYPTO_ETHUSDT_5M["High"].to_numpy()
+    bid = CRYPTO_ETHUSDT_5M["Low"].to_numpy()
+    reward_calculator = RewardCalculator(0.001, 0.001, ask=ask, bid=bid)
+    vector_calculator = VectorRewardCalculator(1, 0.001, 0.001, ask=ask, bid=bid)
+
+    # long 0.5 unit, scaled in twice at other prices, then half closed
+    updates = [(0.0, 0.5, 10, 9), (0.5, 0.25, 15, 10), (0.75, 0.25, 20, 15)]
+    updates.append((1.0, -0.5, 30, 20))
+    for position, action, tick, last_trade_tick in updates:
+        reward_calculator.update(position, action, tick, last_trade_tick)
+        vector_calculator.update(
+            *(np.array([value]) for value in (0, position, action, tick)),
+            np.array([last_trade_tick]),
+        )
+
+    average_price = 0.5 * ask[10] + 0.25 * ask[15] + 0.25 * ask[20]
+    assert reward_calculator._quantity == pytest.approx(0.5)
+    assert reward_calculator._average_trade_price() == pytest.approx(average_price)
+    assert reward_calculator._entry_price == ask[10]
+    # the closed half is priced at the average of all three entries
+    price_diff = bid[30] - average_price
+    info = reward_calculator.get_info()
+    assert info["Trades"] == 1.0
+    assert info["Profit"] + info["Loss"] == pytest.approx(
+        0.5 * (price_diff - abs(price_diff) * 0.001)
+    )
+    np.testing.assert_array_equal(
+        vector_calculator._metrics[0], reward_calculator._metrics
+    )
+
+
+def test_reward_calculator_info_keys():
+    reward_calculator = RewardCalculator(
+        ask=CRYPTO_ETHUSDT_5M["High"],
+        bid=CRYPTO_ETHUSDT_5M["Low"],
+        trade_fee_ask_percent=0.01,
+        trade_fee_bid_percent=0.01,
+    )
+    keys = ("Trades", "SQN", "MaxDD")
+
+    reward_calculator.update(0.0, 1.0, 10, 9)
+    assert reward_calculator.get_info(()) == {}
+    assert reward_calculator.get_info(keys) == {
+        "Trades": 0.0,
+        "SQN": 0.0,
+        "MaxDD": 0.0,
+    }
+
+    # cached rewards are dropped once a trade updates the metrics
+    reward_calculator.update(1.0, -2.0, 20, 10)
+    info = reward_calculator.get_info()
+    assert reward_calculator.get_info(keys) == {key: info[key] for key in keys}
+    assert info["Trades"] == 1.0
+    assert info["MaxDD"] == reward_calculator.reward(RewardType.MaxDD) != 0.0
+
+    with pytest.raises(ValueError):
+        check_info_keys(["Trades", "Unknown"])
+
+
+def test_sparse_table():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=1000)
+    starts = rng.integers(0, 999, 500)
+    stops = starts + rng.integers(1, 1000 - starts)
+
+    for op, reduce in [(np.minimum, np.min), (np.maximum, np.max)]:
+        table = SparseTable(values, op)
+        expected = [reduce(values[i:j]) for i, j in zip(starts, stops)]
+        assert [table.query(i, j) for i, j in zip(starts, stops)] == expected
+        np.testing.assert_array_equal(table.query_many(starts, stops), expected)
+        assert np.isnan(table.query(-1, 0))
+
+
+def test_reward_calculator_frame_bound():
+    ask = CRYPTO_ETHUSDT_5M["High"]
+    bid = CRYPTO_ETHUSDT_5M["Low"]
+    frame_bound, window_size = (110, 200), 10
+
+    full = RewardCalculator(0.01, 0.01, ask=ask, bid=bid)
+    framed = RewardCalculator(
+        0.01, 0.01, ask=ask, bid=bid, frame_bound=frame_bound, window_size=window_size
+    )
+    offset = frame_bound[0] - window_size
+    # the drawdown tables are only built by the first closing trade
+    assert "_ask_min" not in framed.__dict__
+
+    # tick 0 of the frame is row `offset` of the data
+    for position, action, tick, last_trade_tick in [
+        (0.0, 1.0, 5, 4),
+        (1.0, -2.0, 20, 5),
+        (-1.0, 2.0, 60, 20),
+    ]:
+        full.update(position, action, tick + offset, last_trade_tick + offset)
+        framed.update(position, action, tick, last_trade_tick)
+    assert framed.get_info() == full.get_info()
+    assert "_ask_min" in framed.__dict__ and "_bid_max" in framed.__dict__
+    assert framed._ask.flags.c_contiguous and framed._ask.dtype == np.float64
+
+    with pytest.raises(ValueError):
+        RewardCalculator(
+            0.01, 0.01, ask=ask, bid=bid, frame_bound=(5, 100), window_size=10
+        )
+    with pytest.raises(ValueError):
+        RewardCalculator(0.01, 0.01, ask=ask, bid=bid.iloc[1:])
+
+
+def test_reward_calculator_mark_to_market():
+    ask = CRYPTO_ETHUSDT_5M["High"].to_numpy()
+    bid = CRYPTO_ETHUSDT_5M["Low"].to_numpy()
+    fee = 0.001
+    reward_calculator = RewardCalculator(
+        fee, fee, ask=ask, bid=bid, mark_to_market=True
+    )
+    assert "EquityLogReturns" in reward_calculator.get_info()
+    assert (
+        "EquityLogReturns"
+        not in RewardCalculator(fee, fee, ask=ask, bid=bid).get_info()
+    )
+
+    # long 1 unit bought at the ask of tick 10
+    reward_calculator.update(0.0, 1.0, 10, 9)
+    log_peak, max_dd = 0.0, 0.0
+    for tick in range(10, 60):
+        reward_calculator.mark_to_market(tick)
+        price_diff = bid[tick] - ask[10]
+        log_equity = np.log1p((price_diff - abs(price_diff) * fee) / ask[10])
+        log_peak = max(log_peak, log_equity)
+        max_dd = min(max_dd, np.expm1(log_equity - log_peak))
+
+        info = reward_calculator.get_info()
+        assert info["EquityLogReturns"] == pytest.approx(log_equity)
+        assert info["Drawdown"] == pytest.approx(np.expm1(log_equity - log_peak) * 100)
+        assert info["EquityMaxDD"] == pytest.approx(max_dd * 100)
+        assert info["DDPenalizedLogReturns"] == pytest.approx(
+            log_equity + np.log1p(max_dd)
+        )
+
+    # reversed: realized log returns plus the new short, entered at the bid
+    reward_calculator.update(1.0, -2.0, 60, 10)
+    reward_calculator.mark_to_market(60)
+    info = reward_calculator.get_info()
+    price_diff = bid[60] - ask[60]
+    assert info["LogEquity"] == pytest.approx(
+        info["LogReturns"] + np.log1p((price_diff - abs(price_diff) * fee) / bid[60])
+    )
+
+    reward_calculator.reset()
+    assert reward_calculator.get_info()["EquityLogReturns"] == 0.0
+
+    # equity rewards are not maintained without mark-to-market
+    with pytest.raises(ValueError, match="EquityLogReturns"):
+        RewardCalculator(fee, fee, ask=ask, bid=bid).reward(RewardType.EquityLogReturns)
+    with pytest.raises(ValueError):
+        check_info_keys(["Trades", "EquityLogReturns"])
+    assert check_info_keys(["EquityLogReturns"], mark_to_market=True)
+
+
+def test_reward_calculator_streaming_ratios():
+    reward_calculator = RewardCalculator(
+        0.001, 0.001, ask=CRYPTO_ETHUSDT_5M["High"], bid=CRYPTO_ETHUSDT_5M["Low"]
+    )
+
+    # flip the position every few ticks and collect each trade's log return
+    rng = np.random.default_rng(0)
+    ticks = np.cumsum(rng.integers(1, 30, 200)) + 10
+    position, last_trade_tick, log_returns = 1.0, ticks[0] - 1, []
+    reward_calculator.update(-1.0, 2.0, ticks[0], last_trade_tick)
+    for last_trade_tick, tick in zip(ticks[:-1], ticks[1:]):
+        before = reward_calculator.get_info()["LogReturns"]
+        reward_calculator.update(position, -2.0 * position, tick, last_trade_tick)
+        log_returns.append(reward_calculator.get_info()["LogReturns"] - before)
+        position = -position
+
+    log_returns = np.array(log_returns)
+    mean = log_returns.mean()
+    downside_deviation = np.sqrt(np.mean(np.minimum(log_returns, 0) ** 2))
+    equity = np.concatenate(([0.0], np.cumsum(log_returns)))
+    closed_max_dd = np.min(np.expm1(equity - np.maximum.accumulate(equity)))
+
+    info = reward_calculator.get_info()
+    assert info["SharpeRatio"] == pytest.approx(mean / log_returns.std())
+    assert info["SortinoRatio"] == pytest.approx(mean / downside_deviation)
+    assert info["CalmarRatio"] == pytest.approx(-mean / closed_max_dd)
+    assert info["RoMaD"] == pytest.approx(-np.expm1(equity[-1]) / (info["MaxDD"] / 100))
@@ -61,6 +61,17 @@ class Metrics(Enum):
     WinTrades = auto()  # 勝ち取引回数
     LoseTrades = auto()  # 負け取引回数
     MaxDD = auto()  # 最大ドローダウン
+    MeanLogReturns = auto()  # 取引毎のログリターンの平均
+    VarLogReturns = auto()  # 取引毎のログリターンの偏差平方和 (Welford)
+    DownsideTrades = auto()  # ログリターンが負の取引回数
+    MeanDownsideLogReturns = auto()  # 負のログリターンの平均
+    VarDownsideLogReturns = auto()  # 負のログリターンの偏差平方和 (Welford)
+    PeakLogReturns = auto()  # 確定損益のログエクイティの最大値
+    ClosedMaxDD = auto()  # 確定損益のエクイティの最大ドローダウン
+    # 値洗い (mark_to_market=True の場合のみ更新)
+    LogEquity = auto()  # 評価損益込みのログエクイティ
+    LogPeakEquity = auto()  # ログエクイティの最大値
+    EquityMaxDD = auto()  # エクイティの最大ドローダウン
 
 
 # 逐次計算する指標
@@ -88,7 +99,13 @@ class RewardType(Enum):
     # TODO: 時間軸をそろえなければならない．日次，年次
     # https://github.com/kernc/backtesting.py/blob/0ce24d80b1bcb8120d95d31dc3bb351b1052a27d/backtesting/_stats.py#L113
     RecoveryFactor = auto()  # リカバリーファクター = 損益 / 最大ドローダウン
-    # SharpeRatio = auto()  # シャープレシオ
-    # SortinoRatio = auto()  # ソルティノレシオ
-    # CalmarRatio = auto()  # カルマーレシオ
-    # RoMaD = auto()  # リターン(%)/最大ドローダウン
+    # 値洗いによる毎ティックの報酬 (mark_to_market=True が必要)
+    EquityLogReturns = auto()  # ログエクイティ (差分がティック毎のログリターン)
+    Drawdown = auto()  # 現在のドローダウン(Percentage)
+    EquityMaxDD = auto()  # エクイティの最大ドローダウン(Percentage)
+    DDPenalizedLogReturns = auto()  # ログエクイティ + log(1 + 最大ドローダウン)
+    # 取引毎のログリターンによる (年率換算しない) 指標
+    SharpeRatio = auto()  # シャープレシオ = 平均 / 標準偏差
+    SortinoRatio = auto()  # ソルティノレシオ = 平均 / 下方偏差
+    CalmarRatio = auto()  # カルマーレシオ = 平均 / 確定損益の最大ドローダウン
+    RoMaD = auto()  # リターン(%)/最大ドローダウン
@@ -8,9 +8,9 @@ setup(
     author_email="mdan.hagh@gmail.com",
     license="MIT",
     install_requires=[
-        "gymnasium>=0.29.1",
-        "numpy>=1.16.4",
-        "pandas>=0.24.2",
+        "gymnasium>=1.1.0",
+        "numpy>=1.20.0",
+        "pandas>=2.0.0",
         "pyts>=0.13.0",
         "matplotlib>=3.1.1",
         "pyts>=0.13.0",